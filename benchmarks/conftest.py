@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from benchmarks.models import (
+    EchoResource,
+    make_users
+)
+from ninjin.loopback import (
+    LoopbackBroker,
+    LoopbackMessage
+)
+from ninjin.pool import Pool
+
+SERVICE_NAME = 'bench'
+
+
+@pytest.fixture(scope='session')
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope='session')
+def pool(loop):
+    """
+    Single pool serving and calling itself through the in-process broker
+    """
+    EchoResource.rows = {count: make_users(count) for count in (1, 100, 1000)}
+    pool = Pool(SERVICE_NAME, exchange_name='ninjin', connection_factory=LoopbackBroker().connect)
+    loop.run_until_complete(pool.connect())
+    loop.run_until_complete(pool.register(EchoResource))
+    loop.run_until_complete(pool.start())
+    yield pool
+    loop.run_until_complete(pool.close())
+
+
+@pytest.fixture
+def make_message():
+    class _Message:
+        body = b''
+        headers = {}
+        content_type = delivery_mode = priority = expiration = message_id = timestamp = None
+
+        def __init__(self, reply_to=None, correlation_id=None):
+            self.reply_to = reply_to
+            self.correlation_id = correlation_id
+
+    def factory(reply_to=None, correlation_id=None):
+        return LoopbackMessage(_Message(reply_to, correlation_id), routing_key=SERVICE_NAME)
+    return factory
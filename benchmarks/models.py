@@ -0,0 +1,84 @@
+import uuid
+from datetime import datetime
+
+from gino import Gino
+from marshmallow import (
+    Schema,
+    fields
+)
+from sqlalchemy.dialects.postgresql import UUID
+
+from ninjin.decorator import actor
+from ninjin.filtering import (
+    ALL,
+    EXACT,
+    GREATER_THAN,
+    IN,
+    LESSER_THAN_OR_EQUAL
+)
+from ninjin.resource import (
+    ModelResource,
+    Resource
+)
+
+db = Gino()
+
+
+class User(db.Model):
+    __tablename__ = 'users'
+
+    id = db.Column(UUID, primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
+    date_created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    nickname = db.Column(db.Unicode())
+    age = db.Column(db.Integer, default=18)
+
+
+class UserSchema(Schema):
+    id = fields.UUID()
+    date_created = fields.DateTime()
+    nickname = fields.String()
+    age = fields.Integer()
+
+
+class UserResource(ModelResource):
+    __slots__ = ()
+
+    model = User
+    serializer_class = UserSchema
+    deserializer_class = UserSchema
+    allowed_filters = {
+        'id': (EXACT, IN),
+        'age': ALL,
+        'nickname': (EXACT,),
+        'date_created': (GREATER_THAN, LESSER_THAN_OR_EQUAL),
+    }
+    allowed_ordering = ('age', 'nickname', 'date_created')
+
+
+class EchoResource(Resource):
+    """
+    Stub handlers, no DB involved
+    """
+    __slots__ = ()
+
+    rows = {}
+
+    @actor()
+    async def echo(self):
+        return self.payload
+
+    @actor(serializer_class=UserSchema)
+    async def rows_list(self):
+        return self.rows[self.payload['count']]
+
+
+def make_users(count):
+    return [
+        User(
+            id=uuid.uuid4(),
+            date_created=datetime(2020, 1, 1),
+            nickname='user {}'.format(i),
+            age=i % 90,
+        )
+        for i in range(count)
+    ]
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def echo(pool):
+    return pool.queues.resources['echo']
+
+
+def test_dispatch(benchmark, loop, echo, make_message):
+    message = make_message(reply_to='nowhere', correlation_id='1')
+
+    def dispatch():
+        resource = echo({'handler': 'echo', 'payload': {'ping': 'pong'}}, message)
+        loop.run_until_complete(resource.dispatch())
+    benchmark(dispatch)
+
+
+@pytest.mark.parametrize('rows', [1, 100, 1000])
+def test_actor_reply(benchmark, loop, echo, make_message, rows):
+    message = make_message(reply_to='nowhere', correlation_id='1')
+
+    def dispatch():
+        resource = echo({'handler': 'rows_list', 'payload': {'count': rows}}, message)
+        loop.run_until_complete(resource.dispatch())
+    benchmark(dispatch)
+
+
+def test_loopback_round_trip(benchmark, loop, pool):
+    def round_trip():
+        return loop.run_until_complete(pool.rpc(
+            {'ping': 'pong'},
+            service_name=pool.service_name,
+            remote_resource='echo',
+            remote_handler='echo'
+        ))
+    result = benchmark(round_trip)
+    assert result['payload'] == {'ping': 'pong'}
+
+
+@pytest.mark.parametrize('items', [10])
+def test_loopback_separate_round_trips(benchmark, loop, pool, items):
+    async def calls():
+        return await asyncio.gather(*[
+            pool.rpc({'ping': i}, service_name=pool.service_name, remote_resource='echo', remote_handler='echo')
+            for i in range(items)
+        ])
+    result = benchmark(lambda: loop.run_until_complete(calls()))
+    assert len(result) == items
+
+
+@pytest.mark.parametrize('items', [10])
+def test_loopback_batch_round_trip(benchmark, loop, pool, items):
+    requests = [{'resource': 'echo', 'handler': 'echo', 'payload': {'ping': i}} for i in range(items)]
+    result = benchmark(lambda: loop.run_until_complete(pool.batch(requests, service_name=pool.service_name)))
+    assert [item['payload'] for item in result] == [{'ping': i} for i in range(items)]
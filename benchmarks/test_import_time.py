@@ -0,0 +1,51 @@
+"""
+`python -X importtime` budget for publish-only clients
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+BUDGET_MS = float(os.getenv('NINJIN_IMPORT_BUDGET_MS', 250))
+RUNS = 3
+# server side dependencies, a client which only publishes must not load them
+HEAVY_MODULES = ('gino', 'sqlalchemy', 'marshmallow')
+
+
+def import_time(module):
+    """
+    :return: (cumulative import time in ms, loaded heavy modules)
+    """
+    code = 'import sys, {}; print(",".join(m for m in {!r} if m in sys.modules))'.format(module, HEAVY_MODULES)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        check=True
+    )
+    cumulative = None
+    for line in result.stderr.decode().splitlines():
+        _, _, name = line.rpartition('|')
+        if name.strip() == module:
+            cumulative = int(line.split('|')[1]) / 1000
+    loaded = [m for m in result.stdout.decode().strip().split(',') if m]
+    return cumulative, loaded
+
+
+@pytest.mark.parametrize('module', ['ninjin.pool', 'ninjin.loadgen'])
+def test_publish_only_import(module):
+    timings = []
+    for _ in range(RUNS):
+        cumulative, loaded = import_time(module)
+        assert loaded == []
+        timings.append(cumulative)
+    assert min(timings) < BUDGET_MS, '{} imports in {:.1f}ms, budget is {}ms'.format(module, min(timings), BUDGET_MS)
+
+
+def test_logging_is_not_configured():
+    code = 'import logging, ninjin.pool; print(len(logging.getLogger().handlers))'
+    result = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert result.stdout.strip() == b'0'
@@ -0,0 +1,130 @@
+"""
+tracemalloc allocation budget per handled message and isolation of pools
+"""
+import gc
+import os
+import tracemalloc
+import types
+
+from benchmarks.models import (
+    EchoResource,
+    UserResource
+)
+from ninjin.filtering import BasicFiltering
+from ninjin.loopback import LoopbackBroker
+from ninjin.ordering import BasicOrdering
+from ninjin.pagination import BasicPagination
+from ninjin.pool import Pool
+
+MESSAGES = 10000
+# bytes kept alive by one ModelResource message with its filtering, ordering and pagination
+BUDGET_BYTES = float(os.getenv('NINJIN_MESSAGE_BUDGET_BYTES', 1024))
+# bytes left behind by one dispatched message, anything above means a leak
+LEAK_BYTES = 16
+
+LIST_REQUEST = dict(
+    handler='get_list',
+    payload={},
+    filtering={'age__gt': 18},
+    ordering='-age',
+    pagination={'page': 1, 'items_per_page': 50},
+)
+
+
+def traced(func, *args):
+    """
+    :return: bytes allocated by `func` which are still alive afterwards
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        started, _ = tracemalloc.get_traced_memory()
+        result = func(*args)
+        gc.collect()
+        finished, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return finished - started, result
+
+
+def without_slots(cls, **attributes):
+    """
+    Copy of `cls` keeping its attributes in a `__dict__`, the layout before slots
+    """
+    namespace = {}
+    for base in reversed(cls.__mro__[:-1]):
+        namespace.update(
+            (name, value) for name, value in vars(base).items()
+            if name not in ('__slots__', '__dict__', '__weakref__')
+            and not isinstance(value, types.MemberDescriptorType)
+        )
+    namespace.update(attributes)
+    return type(cls.__name__, (), namespace)
+
+
+def allocation(resource_class):
+    def messages():
+        result = []
+        for _ in range(MESSAGES):
+            resource = resource_class(LIST_REQUEST, message=None)
+            resource.filtering.empty, resource.ordering.ordering, resource.pagination.result
+            result.append(resource)
+        return result
+
+    allocated, resources = traced(messages)
+    return allocated / MESSAGES, resources[0]
+
+
+def test_message_allocation():
+    per_message, resource = allocation(UserResource)
+    for part in (resource, resource.filtering, resource.ordering, resource.pagination):
+        assert not hasattr(part, '__dict__'), part
+    assert per_message < BUDGET_BYTES, '{:.0f} bytes per message, budget is {:.0f}'.format(per_message, BUDGET_BYTES)
+
+    before, _ = allocation(without_slots(
+        UserResource,
+        filtering_class=without_slots(BasicFiltering),
+        ordering_class=without_slots(BasicOrdering),
+        pagination_class=without_slots(BasicPagination),
+    ))
+    assert per_message < before, '{:.0f} bytes per message, {:.0f} without slots'.format(per_message, before)
+
+
+def test_dispatch_does_not_leak(loop, pool, make_message):
+    echo = pool.queues.resources['echo']
+    message = make_message()
+
+    def dispatch():
+        for i in range(MESSAGES):
+            loop.run_until_complete(echo({'handler': 'echo', 'payload': {'ping': i}}, message).dispatch())
+
+    dispatch()
+    allocated, _ = traced(dispatch)
+    assert allocated / MESSAGES < LEAK_BYTES
+
+
+def test_pools_do_not_share_state(loop, pool):
+    other = Pool(pool.service_name, exchange_name='ninjin', connection_factory=LoopbackBroker().connect)
+    loop.run_until_complete(other.connect())
+    try:
+        # the same resource in a second pool of the process
+        loop.run_until_complete(other.register(EchoResource))
+        loop.run_until_complete(other.start())
+        reply = loop.run_until_complete(other.rpc(
+            {'ping': 'pong'},
+            service_name=other.service_name,
+            remote_resource='echo',
+            remote_handler='echo'
+        ))
+        assert reply['payload'] == {'ping': 'pong'}
+
+        for name in ('queues', 'resources', 'futures'):
+            assert getattr(pool.queues, name) is not getattr(other.queues, name)
+        assert pool.queues.resources['echo'].pool is pool
+        # registering keeps the resource slotted
+        assert not hasattr(pool.queues.resources['echo']({}, message=None), '__dict__')
+        assert other.queues.resources['echo'].pool is other
+        assert other.queues.futures == {}
+        assert not EchoResource.actors and not EchoResource.periodic_tasks
+    finally:
+        loop.run_until_complete(other.close())
@@ -0,0 +1,66 @@
+import uuid
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from benchmarks.models import (
+    User,
+    UserResource
+)
+from ninjin.filtering import BasicFiltering
+from ninjin.ordering import BasicOrdering
+from ninjin.pagination import BasicPagination
+
+dialect = postgresql.dialect()
+
+FILTER_SETS = {
+    'empty': {},
+    'pk': {'id': str(uuid.uuid4())},
+    'range': {'age__gt': 18, 'age__lte': 65, 'date_created__gt': '2020-01-01'},
+    'mixed': {
+        'id__in': [str(uuid.uuid4()) for _ in range(20)],
+        'age__gte': 21,
+        'nickname': 'john',
+        'unknown__exact': 1,
+        'age__regex': 'ignored',
+    },
+}
+
+
+@pytest.mark.parametrize('name', sorted(FILTER_SETS))
+def test_filtering(benchmark, name):
+    def compile_filters():
+        filtering = BasicFiltering(User, FILTER_SETS[name], UserResource.allowed_filters)
+        return filtering.filter(User.query).compile(dialect=dialect)
+    benchmark(compile_filters)
+
+
+def test_ordering(benchmark):
+    def compile_ordering():
+        ordering = BasicOrdering('-age', UserResource.allowed_ordering)
+        return ordering.order_by(User.query).compile(dialect=dialect)
+    benchmark(compile_ordering)
+
+
+def test_pagination(benchmark):
+    def compile_pagination():
+        pagination = BasicPagination(
+            {'page': 3, 'items_per_page': 50},
+            items_per_page=UserResource.items_per_page,
+            max_items_per_page=UserResource.max_items_per_page
+        )
+        return pagination.paginate(User.query).compile(dialect=dialect)
+    benchmark(compile_pagination)
+
+
+def test_full_list_query(benchmark):
+    def compile_query():
+        resource = UserResource(dict(
+            handler='get_list',
+            filtering=FILTER_SETS['range'],
+            ordering='-age',
+            pagination={'page': 1, 'items_per_page': 50},
+        ), message=None)
+        query = resource.paginate(resource.order(resource.query))
+        return query.compile(dialect=dialect)
+    benchmark(compile_query)
@@ -0,0 +1,56 @@
+import uuid
+
+import pytest
+
+from ninjin.envelope import (
+    Envelope,
+    dumps,
+    routing_headers
+)
+from ninjin.schema import PayloadSchema
+
+schema = PayloadSchema()
+
+
+def envelope(rows):
+    return dict(
+        resource='user',
+        handler='get_list',
+        payload=[
+            {'id': str(uuid.uuid4()), 'nickname': 'user {}'.format(i), 'age': i}
+            for i in range(rows)
+        ],
+        filtering={'age__gt': 18, 'nickname': 'john'},
+        ordering='-age',
+        pagination={'page': 2, 'items_per_page': 50},
+    )
+
+
+@pytest.mark.parametrize('rows', [1, 100, 1000])
+def test_dumps(benchmark, rows):
+    data = envelope(rows)
+    benchmark(schema.dumps, data)
+
+
+@pytest.mark.parametrize('rows', [1, 100, 1000])
+def test_loads(benchmark, rows):
+    body = schema.dumps(envelope(rows))
+    result = benchmark(schema.loads, body)
+    assert len(result['payload']) == rows
+
+
+@pytest.mark.parametrize('rows', [1, 100, 1000])
+def test_envelope_dumps(benchmark, rows):
+    data = envelope(rows)
+    benchmark(dumps, data)
+
+
+@pytest.mark.parametrize('rows', [1, 100, 1000])
+def test_envelope_routing(benchmark, rows):
+    data = envelope(rows)
+    body, headers = dumps(data), routing_headers(data)
+
+    def route():
+        received = Envelope(body, headers)
+        return received.resource, received['handler']
+    assert benchmark(route) == ('user', 'get_list')
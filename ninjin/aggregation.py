@@ -0,0 +1,120 @@
+import datetime
+import uuid
+from typing import Iterable
+
+from sqlalchemy import (
+    func,
+    select
+)
+
+from ninjin.decorator import (
+    lazy,
+    listify
+)
+from ninjin.filtering import SEPARATOR
+
+COUNT = 'count'
+SUM = 'sum'
+MIN = 'min'
+MAX = 'max'
+AVG = 'avg'
+ALL = (
+    COUNT,
+    SUM,
+    MIN,
+    MAX,
+    AVG
+)
+
+
+def jsonable(value):
+    """
+    Group by values go to the reply as they are, dates and UUIDs become strings
+    """
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+class BasicAggregation:
+    """
+    Builds `SELECT <group_by>, <fn>(<field>) ... GROUP BY <group_by>` from
+    `{"aggregates": {"funds": ["sum", "avg"]}, "group_by": ["orders"]}`,
+    result columns are named `<field>__<fn>`
+    """
+    __slots__ = (
+        'model',
+        'aggregates',
+        'group_by_',
+        'allowed_aggregates',
+        'allowed_group_by',
+        '_lazy_applicable_aggregates',
+        '_lazy_applicable_group_by',
+        '_lazy_empty',
+    )
+
+    FUNCTION = {
+        COUNT: func.count,
+        SUM: func.sum,
+        MIN: func.min,
+        MAX: func.max,
+        AVG: func.avg
+    }
+
+    def __init__(self, model, aggregates: dict, group_by: Iterable, allowed_aggregates: dict, allowed_group_by):
+        self.model = model
+        self.aggregates = aggregates or {}
+        self.group_by_ = group_by or ()
+        self.allowed_aggregates = allowed_aggregates or {}
+        self.allowed_group_by = allowed_group_by or ()
+
+    @lazy
+    @listify
+    def applicable_aggregates(self):
+        for field, functions in self.aggregates.items():
+            if isinstance(functions, str):
+                functions = [functions]
+            for fn in functions:
+                if field in self.allowed_aggregates and \
+                        fn in ALL and \
+                        fn in self.allowed_aggregates[field]:
+                    yield field, fn
+
+    @lazy
+    @listify
+    def applicable_group_by(self):
+        for field in self.group_by_:
+            if field in self.allowed_group_by:
+                yield field
+
+    @lazy
+    def empty(self):
+        return not bool(self.applicable_aggregates)
+
+    def _columns(self, source):
+        for field in self.applicable_group_by:
+            yield source.c[field]
+        for field, fn in self.applicable_aggregates:
+            yield self.FUNCTION[fn](source.c[field]).label(field + SEPARATOR + fn)
+
+    def aggregate(self, query):
+        """
+        :param query: filtered query of the resource, aggregated as a subquery
+        """
+        source = query.alias('aggregated')
+        aggregate = select(list(self._columns(source)))
+        if self.applicable_group_by:
+            group_by = [source.c[field] for field in self.applicable_group_by]
+            aggregate = aggregate.group_by(*group_by).order_by(*group_by)
+        return aggregate
+
+    def result(self, rows):
+        """
+        One dict without grouping, a list of dicts per group otherwise
+        """
+        rows = [{key: jsonable(value) for key, value in row.items()} for row in rows]
+        if self.applicable_group_by:
+            return rows
+        return rows[0] if rows else {}
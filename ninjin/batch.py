@@ -0,0 +1,41 @@
+"""
+Several requests to one service in one message and one reply, see `Pool.batch`
+"""
+OK = 'ok'
+ERROR = 'error'
+
+BATCH_RESOURCE_NAME = '_batch'
+# reply_to of batch items, their replies are collected instead of published
+BATCH_REPLY = '_batch'
+
+
+class BatchItemMessage:
+    """
+    Stands for the batch message while one of its items is handled
+    """
+    reply_to = BATCH_REPLY
+    correlation_id = None
+
+    def __init__(self, message):
+        self.message = message
+        self.headers = message.headers
+        self.payload = None
+        self.pagination = None
+
+    def collect(self, payload, pagination=None):
+        self.payload = payload
+        self.pagination = pagination
+
+    def result(self) -> dict:
+        return {
+            'status': OK,
+            'payload': self.payload,
+            'pagination': self.pagination,
+        }
+
+
+def error(e: Exception) -> dict:
+    return {
+        'status': ERROR,
+        'error': '{}: {}'.format(e.__class__.__name__, e),
+    }
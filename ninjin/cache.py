@@ -0,0 +1,116 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+from ninjin.coalescing import SingleFlight
+from ninjin.logger import logger
+
+FRESH = 'fresh'
+STALE = 'stale'
+
+
+class ResponseCache:
+    """
+    LRU cache of RPC replies with per-resource TTLs.
+
+    Replies older than their TTL are still served during `stale_ttl` seconds
+    while a single background request refreshes them. Cached replies are
+    shared between callers and must not be modified.
+    """
+    def __init__(self,
+                 max_size: int = 1024,
+                 ttl: float = 60,
+                 stale_ttl: float = 0,
+                 ttls: dict = None,
+                 clock=time.monotonic):
+        """
+        :param max_size: number of replies kept, least recently used are evicted first
+        :param ttl: default TTL (seconds) for calls that enable the cache explicitly
+        :param stale_ttl: how long an expired reply may be served while it is revalidated
+        :param ttls: {remote_resource: ttl}, replies of these resources are cached by default
+        :param clock:
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.ttls = ttls or {}
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.single_flight = SingleFlight()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def enabled_for(self, remote_resource, cache=None) -> bool:
+        if cache is not None:
+            return bool(cache)
+        return remote_resource in self.ttls
+
+    def ttl_for(self, remote_resource) -> float:
+        return self.ttls.get(remote_resource, self.ttl)
+
+    def get(self, key, remote_resource=None):
+        """
+        :return: (reply, FRESH | STALE) or (None, None) on miss
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            reply, stored_at = entry
+            age = self.clock() - stored_at
+            ttl = self.ttl_for(remote_resource)
+            if age <= ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return reply, FRESH
+            if age <= ttl + self.stale_ttl:
+                self.entries.move_to_end(key)
+                self.stale_hits += 1
+                return reply, STALE
+            del self.entries[key]
+        self.misses += 1
+        return None, None
+
+    def set(self, key, reply):
+        self.entries[key] = (reply, self.clock())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key=None):
+        if key is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(key, None)
+
+    async def fetch(self, key, fetcher):
+        """
+        Concurrent misses of the same key share one round trip
+        """
+        async def fetch_and_store():
+            reply = await fetcher()
+            self.set(key, reply)
+            return reply
+        return await self.single_flight.do(key, fetch_and_store)
+
+    def revalidate(self, key, fetcher):
+        def done(future):
+            if not future.cancelled() and future.exception():
+                logger.warning('Cache revalidation failed: {!r}'.format(future.exception()))
+        asyncio.ensure_future(self.fetch(key, fetcher)).add_done_callback(done)
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.stale_hits + self.misses
+        return (self.hits + self.stale_hits) / total if total else None
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': self.hit_ratio,
+        }
@@ -0,0 +1,34 @@
+import asyncio
+import typing
+
+import simplejson
+
+
+def make_key(*parts) -> str:
+    """
+    Stable key for JSON-like request parts
+    """
+    return simplejson.dumps(parts, sort_keys=True, default=str)
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one execution,
+    every caller receives the result (or the exception) of the first one
+    """
+    def __init__(self):
+        self.calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: typing.Hashable, func: typing.Callable[[], typing.Awaitable]):
+        future = self.calls.get(key)
+        if future is None:
+            self.executed += 1
+            future = asyncio.ensure_future(func())
+            self.calls[key] = future
+            future.add_done_callback(lambda f: self.calls.pop(key, None))
+        else:
+            self.coalesced += 1
+        # a cancelled caller must not cancel the call the others are waiting for
+        return await asyncio.shield(future)
@@ -0,0 +1,147 @@
+import asyncio
+import time
+from collections import (
+    Counter,
+    deque
+)
+
+from ninjin.logger import logger
+from ninjin.metrics import percentile
+
+INCREASE = 'increase'
+LATENCY = 'latency'
+ERRORS = 'errors'
+
+
+class AdaptiveLimit:
+    """
+    Concurrency limit adjusted by AIMD: once per `interval` the limit grows
+    by one if it was reached and the window was healthy, and is multiplied
+    by `decrease` if p95 latency exceeded `target_latency` or the error rate
+    exceeded `max_error_rate`
+    """
+    def __init__(self,
+                 initial: int,
+                 min_limit: int = 1,
+                 max_limit: int = 100,
+                 target_latency: float = 0.1,
+                 max_error_rate: float = 0.05,
+                 decrease: float = 0.7,
+                 interval: float = 1,
+                 on_change=None,
+                 clock=time.monotonic):
+        """
+        :param initial:
+        :param min_limit:
+        :param max_limit:
+        :param target_latency: seconds, p95 of handling time
+        :param max_error_rate: 0..1
+        :param decrease: multiplier applied on an unhealthy window
+        :param interval: seconds between decisions
+        :param on_change: called with the new limit
+        :param clock:
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = min(max(initial, min_limit), max_limit)
+        self.target_latency = target_latency
+        self.max_error_rate = max_error_rate
+        self.decrease = decrease
+        self.interval = interval
+        self.on_change = on_change
+        self.clock = clock
+        self.in_flight = 0
+        self.decisions = Counter()
+        self.history = deque(maxlen=100)
+        self._waiters = deque()
+        self._latencies = []
+        self._errors = 0
+        self._saturated = False
+        self._window_started = clock()
+
+    async def acquire(self):
+        while self.in_flight >= self.limit:
+            self._saturated = True
+            waiter = asyncio.get_event_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # pass the slot on if it was already given to this waiter
+                self._remove(waiter)
+                self._wake()
+                raise
+        self.in_flight += 1
+        if self.in_flight >= self.limit:
+            self._saturated = True
+
+    def _remove(self, waiter):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self, latency: float, failed: bool = False):
+        self.in_flight -= 1
+        self._latencies.append(latency)
+        if failed:
+            self._errors += 1
+        now = self.clock()
+        if now - self._window_started >= self.interval:
+            self.adjust(now)
+        self._wake()
+
+    def _wake(self):
+        free = self.limit - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def adjust(self, now):
+        latencies = sorted(self._latencies)
+        p95 = percentile(latencies, 95)
+        error_rate = self._errors / len(latencies) if latencies else 0
+        reason = None
+        if error_rate > self.max_error_rate:
+            reason = ERRORS
+        elif p95 is not None and p95 > self.target_latency:
+            reason = LATENCY
+        elif self._saturated:
+            reason = INCREASE
+
+        limit = self.limit
+        if reason == INCREASE:
+            limit = min(self.limit + 1, self.max_limit)
+        elif reason is not None:
+            limit = max(int(self.limit * self.decrease), self.min_limit)
+
+        self._latencies = []
+        self._errors = 0
+        self._saturated = False
+        self._window_started = now
+        if limit == self.limit:
+            return
+
+        self.decisions[reason] += 1
+        self.history.append({
+            'limit': limit,
+            'previous': self.limit,
+            'reason': reason,
+            'p95': p95,
+            'error_rate': error_rate,
+        })
+        logger.debug('Concurrency limit {} -> {} ({})'.format(self.limit, limit, reason))
+        self.limit = limit
+        if self.on_change is not None:
+            self.on_change(limit)
+
+    def stats(self) -> dict:
+        return {
+            'limit': self.limit,
+            'in_flight': self.in_flight,
+            'waiting': len(self._waiters),
+            'decisions': dict(self.decisions),
+            'history': list(self.history)[-10:],
+        }
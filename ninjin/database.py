@@ -0,0 +1,69 @@
+"""
+Connections and transactions of actors, see `Pool.bind_db`
+"""
+import asyncio
+
+from ninjin.metrics import Timings
+from ninjin.routing import (
+    READ_PRIMARY_HEADER,
+    ReplicaRouter
+)
+
+
+class Database:
+    """
+    Runs actors of transactional resources with a connection and a transaction
+    of their own, read-only actors on a replica when there is a router
+    """
+    def __init__(self, db, router: ReplicaRouter = None):
+        """
+        :param db: `gino.Gino` instance bound to the primary
+        :param router:
+        """
+        self.db = db
+        self.router = router
+        self.wait = Timings(max_samples=10000)
+
+    async def acquire(self, read_only: bool = False, read_primary: bool = False):
+        if self.router is None:
+            # reusable: every GINO query of this task runs on the same connection
+            return await self.db.acquire(reusable=True)
+        engine = self.router.route(read_only, read_primary)
+        try:
+            return await engine.acquire(reusable=True)
+        except Exception as e:
+            if engine is self.db:
+                raise
+            self.router.mark_unhealthy(engine, e)
+            return await self.db.acquire(reusable=True)
+
+    async def transaction(self, resource, call):
+        """
+        The actor replies after the call returns, so callers only see committed data,
+        and coalesced requests waiting for another one don't hold connections
+        :param resource: `connection` is set for the time of the call
+        :param call: coroutine function
+        :return: result of the call
+        """
+        headers = getattr(resource.message, 'headers', None) or {}
+        loop = asyncio.get_event_loop()
+        started = loop.time()
+        connection = await self.acquire(resource.read_only, bool(headers.get(READ_PRIMARY_HEADER)))
+        try:
+            self.wait.observe(loop.time() - started)
+            async with connection.transaction():
+                resource.connection = connection
+                return await call()
+        finally:
+            resource.connection = None
+            await connection.release()
+
+    async def close(self):
+        if self.router is not None:
+            await self.router.close()
+
+    def stats(self) -> dict:
+        stats = {'pool_wait': self.wait.summary()}
+        if self.router is not None:
+            stats['routing'] = self.router.stats()
+        return stats
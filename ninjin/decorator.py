@@ -7,16 +7,28 @@ from ninjin.exceptions import ImproperlyConfigured
 from ninjin.logger import logger
 
 
-def lazy(fn):
-    @property
-    @wraps(fn)
-    def _lazyprop(self):
-        attr_name = '_lazy_' + fn.__name__
-        if not hasattr(self, attr_name):
-            setattr(self, attr_name, fn(self))
-        return getattr(self, attr_name)
+class lazy:
+    """
+    Computed once per instance and kept in the `_lazy_<name>` attribute,
+    classes with `__slots__` have to declare it. Assigning replaces the value
+    """
+    def __init__(self, fn):
+        self.fn = fn
+        self.attr_name = '_lazy_' + fn.__name__
+        functools.update_wrapper(self, fn)
 
-    return _lazyprop
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        try:
+            return getattr(instance, self.attr_name)
+        except AttributeError:
+            value = self.fn(instance)
+            setattr(instance, self.attr_name, value)
+            return value
+
+    def __set__(self, instance, value):
+        setattr(instance, self.attr_name, value)
 
 
 def listify(func):
@@ -37,6 +49,8 @@ def actor(
     remote_resource=None,
     remote_handler='default',
     never_reply=False,
+    priority: int = None,
+    read_only: bool = False,
     **kwargs
 ):
     """
@@ -47,6 +61,8 @@ def actor(
     :param remote_resource:
     :param remote_handler:
     :param never_reply:
+    :param priority: default priority of messages sent to this actor and of its replies
+    :param read_only: the actor does not write, it may run on a read replica
     :return:
     """
     def real_wrapper(func):
@@ -65,28 +81,43 @@ def actor(
                             ' but reply queue is already defined'.format(func.__name__))
 
             queue_to_reply = reply_to or message_asked_for_reply
-
-            func_result = await func(resource, *args, **kwargs)
-            payload = func_result or {}
-            if not queue_to_reply or never_reply:
-                return
+            will_reply = queue_to_reply and not never_reply
+
+            def call():
+                return func(resource, *args, **kwargs)
+
+            coalesce_key = resource.coalesce_key(func.__name__) if will_reply else None
+            if coalesce_key is None:
+                # the transaction is committed before the reply is sent
+                func_result = await resource.execute(call)
+                if not will_reply:
+                    return
+                payload = await resource.pool.offloader.serialize(resource.serialize, func_result or {})
+            else:
+                async def perform():
+                    result = await resource.execute(call)
+                    return await resource.pool.offloader.serialize(resource.serialize, result or {})
+                # identical requests in flight share one execution, one connection and one serialized reply
+                payload = await resource.pool.single_flight.do(coalesce_key, perform)
 
             pagination = None
-            payload = resource.serialize(payload)
             # TODO actually some payloads should not be paginated
             if hasattr(resource, 'pagination'):
                 pagination = resource.pagination.result
 
-            await resource.pool.publish(
+            await resource.reply(
                 payload,
                 pagination=pagination,
                 service_name=queue_to_reply,
                 remote_resource=remote_resource,
                 remote_handler=remote_handler,
-                correlation_id=getattr(resource.message, 'correlation_id')
+                correlation_id=getattr(resource.message, 'correlation_id'),
+                priority=priority
             )
 
         wrapper.is_actor = True
+        wrapper.priority = priority
+        wrapper.read_only = read_only
         if 'serializer_class' in kwargs:
             wrapper.serializer_class = kwargs['serializer_class']
         if 'deserializer_class' in kwargs:
@@ -0,0 +1,99 @@
+"""
+Message envelope encoding.
+
+Publishing only needs JSON, validation of received messages needs
+marshmallow, which is imported on the first `loads`. Resource and handler
+are duplicated in the headers, so a consumer routes a message without
+parsing its body.
+"""
+import simplejson
+
+# fields of `ninjin.schema.PayloadSchema`
+FIELDS = (
+    'resource',
+    'handler',
+    'payload',
+    'filtering',
+    'ordering',
+    'pagination',
+    'forward',
+    'period',
+    'repeat',
+    'batch',
+    'fields',
+)
+
+RESOURCE_HEADER = 'x-resource'
+HANDLER_HEADER = 'x-handler'
+ROUTING_HEADERS = {
+    'resource': RESOURCE_HEADER,
+    'handler': HANDLER_HEADER,
+}
+
+_schema = None
+
+
+def dumps(data: dict) -> bytes:
+    return simplejson.dumps(
+        {key: value for key, value in data.items() if key in FIELDS}
+    ).encode('utf-8')
+
+
+def loads(body: bytes) -> dict:
+    global _schema
+    if _schema is None:
+        from ninjin.schema import PayloadSchema
+        _schema = PayloadSchema()
+    return _schema.loads(body)
+
+
+def routing_headers(data: dict) -> dict:
+    return {
+        header: data[field] for field, header in ROUTING_HEADERS.items() if data.get(field) is not None
+    }
+
+
+class Envelope:
+    """
+    Received message, behaves like the dict returned by `loads`.
+    Routing fields are read from the headers, the body is parsed
+    on the first access to any other field
+    """
+    def __init__(self, body: bytes, headers=None, data: dict = None):
+        """
+        :param body:
+        :param headers:
+        :param data: already parsed body
+        """
+        self.body = body
+        self.headers = headers or {}
+        self._data = data
+
+    def __repr__(self):
+        return '<Envelope {}.{}, {} bytes>'.format(self.resource, self.handler, len(self.body))
+
+    @property
+    def data(self) -> dict:
+        if self._data is None:
+            self._data = loads(self.body)
+        return self._data
+
+    @property
+    def resource(self):
+        return self.get('resource')
+
+    @property
+    def handler(self):
+        return self.get('handler')
+
+    def get(self, key, default=None):
+        header = ROUTING_HEADERS.get(key)
+        if header is not None and header in self.headers:
+            return self.headers[header]
+        return self.data.get(key, default)
+
+    def __getitem__(self, key):
+        header = ROUTING_HEADERS.get(key)
+        if header is not None and header in self.headers:
+            return self.headers[header]
+        return self.data[key]
@@ -28,6 +28,16 @@ class BasicFiltering:
     """
 
     """
+    __slots__ = (
+        'model',
+        'filtering',
+        'allowed_filters',
+        '_lazy_applicable_filters',
+        '_lazy__operators',
+        '_lazy_where_clause',
+        '_lazy_empty',
+    )
+
     OPERATOR = {
         LESSER_THAN: operator.lt,
         LESSER_THAN_OR_EQUAL: operator.le,
@@ -0,0 +1,244 @@
+"""
+Load generator for a registered resource/handler::
+
+    ninjin-bench --service customers --resource customer --handler get \\
+        --payload '{"id": "2e363b49-f713-4fa0-9f0f-7dc699290df4"}' \\
+        --rpc-ratio 0.8 --concurrency 50 --duration 30
+
+Use `--loopback --register package.module:Resource` to run against the
+in-process broker stand-in instead of RabbitMQ.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import random
+import sys
+import time
+from collections import Counter
+
+from ninjin import runtime
+from ninjin.logger import (
+    FORMAT,
+    logger
+)
+from ninjin.metrics import Timings
+from ninjin.pool import Pool
+
+RPC = 'rpc'
+PUBLISH = 'publish'
+
+
+class LoadGenerator:
+    def __init__(self,
+                 pool: Pool,
+                 service_name: str,
+                 remote_resource=None,
+                 remote_handler='default',
+                 payload=None,
+                 rpc_ratio: float = 1.0,
+                 timeout: float = 5.0):
+        self.pool = pool
+        self.service_name = service_name
+        self.remote_resource = remote_resource
+        self.remote_handler = remote_handler
+        self.payload = payload if payload is not None else {}
+        self.rpc_ratio = rpc_ratio
+        self.timeout = timeout
+        self.timings = {RPC: Timings(), PUBLISH: Timings()}
+        self.errors = Counter()
+        self.started = None
+        self.finished = None
+
+    async def call(self, started=None):
+        kind = RPC if random.random() < self.rpc_ratio else PUBLISH
+        loop = asyncio.get_event_loop()
+        started = started or loop.time()
+        kwargs = dict(
+            service_name=self.service_name,
+            remote_resource=self.remote_resource,
+            remote_handler=self.remote_handler
+        )
+        try:
+            if kind == RPC:
+                await asyncio.wait_for(self.pool.rpc(self.payload, **kwargs), self.timeout)
+            else:
+                await self.pool.publish(self.payload, **kwargs)
+        except Exception as e:
+            self.errors['{}: {}'.format(kind, e.__class__.__name__)] += 1
+        else:
+            self.timings[kind].observe(loop.time() - started)
+
+    async def run_concurrency(self, concurrency: int, duration: float = None, requests: int = None):
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + duration if duration else None
+        remaining = [requests]
+
+        async def worker():
+            while deadline is None or loop.time() < deadline:
+                if remaining[0] is not None:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                await self.call()
+
+        await self._measure(asyncio.gather(*[worker() for _ in range(concurrency)]))
+
+    async def run_rate(self, rate: float, duration: float = None, requests: int = None):
+        """
+        Open-loop: calls are started on schedule whatever the latency is,
+        latency is measured from the scheduled time
+        """
+        loop = asyncio.get_event_loop()
+        interval = 1.0 / rate
+        total = requests if requests is not None else int(rate * duration)
+
+        async def schedule():
+            start = loop.time()
+            tasks = []
+            for i in range(total):
+                scheduled = start + i * interval
+                delay = scheduled - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.ensure_future(self.call(started=scheduled)))
+            await asyncio.gather(*tasks)
+
+        await self._measure(schedule())
+
+    async def _measure(self, awaitable):
+        self.started = time.monotonic()
+        try:
+            await awaitable
+        finally:
+            self.finished = time.monotonic()
+
+    def report(self) -> dict:
+        elapsed = (self.finished or time.monotonic()) - self.started
+        completed = sum(len(t) for t in self.timings.values())
+        return {
+            'elapsed': elapsed,
+            'completed': completed,
+            'throughput': completed / elapsed if elapsed else None,
+            'errors': dict(self.errors),
+            'latency': {kind: timings.summary() for kind, timings in self.timings.items() if len(timings)},
+        }
+
+
+def format_report(report: dict) -> str:
+    def ms(value):
+        return '-' if value is None else '{:.2f}'.format(value * 1000)
+
+    lines = [
+        'elapsed:    {:.2f}s'.format(report['elapsed']),
+        'completed:  {}'.format(report['completed']),
+        'throughput: {:.1f} msg/s'.format(report['throughput'] or 0),
+        '',
+        '{:<8} {:>8} {:>9} {:>9} {:>9} {:>9}'.format('kind', 'count', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms'),
+    ]
+    for kind, summary in sorted(report['latency'].items()):
+        lines.append('{:<8} {:>8} {:>9} {:>9} {:>9} {:>9}'.format(
+            kind, summary['count'],
+            ms(summary['p50']), ms(summary['p95']), ms(summary['p99']), ms(summary['max'])
+        ))
+    lines.append('')
+    lines.append('errors:     {}'.format(sum(report['errors'].values())))
+    for error, count in sorted(report['errors'].items()):
+        lines.append('  {:<30} {}'.format(error, count))
+    return '\n'.join(lines)
+
+
+def import_string(path: str):
+    module_name, _, attr = path.partition(':')
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='ninjin-bench', description=__doc__.split('::')[0].strip())
+    parser.add_argument('--service', required=True, help='service name (routing key) to call')
+    parser.add_argument('--resource', default=None)
+    parser.add_argument('--handler', default='default')
+    parser.add_argument('--payload', default='{}', help='JSON payload')
+    parser.add_argument('--rpc-ratio', type=float, default=1.0, help='share of rpc calls, the rest are publish')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--concurrency', type=int, default=10, help='closed-loop: calls in flight')
+    mode.add_argument('--rate', type=float, default=None, help='open-loop: calls per second')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds')
+    parser.add_argument('--requests', type=int, default=None, help='stop after N calls instead of --duration')
+    parser.add_argument('--timeout', type=float, default=5.0, help='rpc timeout, seconds')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=5672)
+    parser.add_argument('--login', default='guest')
+    parser.add_argument('--password', default='guest')
+    parser.add_argument('--exchange', default=None)
+    parser.add_argument('--loopback', action='store_true', help='use the in-process broker stand-in')
+    parser.add_argument('--register', action='append', default=[], metavar='MODULE:RESOURCE',
+                        help='register and serve the resource in the same process')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--no-uvloop', action='store_true', help='stay on the default event loop')
+    parser.add_argument('--loop-lag-threshold', type=float, default=None,
+                        help='seconds, log event loop blocks longer than that')
+    return parser.parse_args(argv)
+
+
+async def run(args) -> dict:
+    connection_factory = None
+    if args.loopback:
+        from ninjin.loopback import connect_loopback
+        connection_factory = connect_loopback
+
+    # when resources are served in-process the pool calls itself
+    pool = Pool(
+        service_name=args.service if args.register else 'ninjin-bench',
+        host=args.host,
+        port=args.port,
+        login=args.login,
+        password=args.password,
+        exchange_name=args.exchange,
+        connection_factory=connection_factory,
+        loop_lag_threshold=args.loop_lag_threshold
+    )
+    await pool.connect()
+    try:
+        for path in args.register:
+            await pool.register(import_string(path))
+        await pool.start()
+
+        generator = LoadGenerator(
+            pool,
+            service_name=args.service,
+            remote_resource=args.resource,
+            remote_handler=args.handler,
+            payload=json.loads(args.payload),
+            rpc_ratio=args.rpc_ratio,
+            timeout=args.timeout
+        )
+        duration = None if args.requests is not None else args.duration
+        if args.rate:
+            await generator.run_rate(args.rate, duration=duration, requests=args.requests)
+        else:
+            await generator.run_concurrency(args.concurrency, duration=duration, requests=args.requests)
+        report = generator.report()
+        if pool.lag_monitor is not None:
+            report['loop'] = pool.lag_monitor.stats()
+        return report
+    finally:
+        await pool.close()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(format=FORMAT)
+    logger.setLevel(args.log_level)
+    report = runtime.run(run(args), use_uvloop=not args.no_uvloop)
+    if args.json:
+        print(json.dumps(report, indent=2))  # noqa: T001
+    else:
+        print(format_report(report))  # noqa: T001
+    return 1 if report['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,7 @@
 import logging
 
+# suggested format, ninjin leaves logging configuration to the application:
+# logging.basicConfig(format=FORMAT)
 FORMAT = '%(asctime)-15s %(module)s %(message)s'
-logging.basicConfig(format=FORMAT)
 logger = logging.getLogger('ninjin')
-logger.setLevel(logging.DEBUG)
+logger.addHandler(logging.NullHandler())
@@ -0,0 +1,221 @@
+"""
+In-process stand-in for the broker.
+
+Mimics the small part of the aio_pika API used by `QueuePool`, so a `Pool`
+can be exercised without RabbitMQ::
+
+    broker = LoopbackBroker()
+    server = Pool('service', connection_factory=broker.connect)
+    client = Pool('client', connection_factory=broker.connect)
+"""
+import asyncio
+import time
+from collections import deque
+
+from ninjin.logger import logger
+
+
+def topic_matches(pattern: str, routing_key: str) -> bool:
+    pattern_words = pattern.split('.')
+    key_words = routing_key.split('.')
+
+    def match(p, k):
+        if p == len(pattern_words):
+            return k == len(key_words)
+        word = pattern_words[p]
+        if word == '#':
+            return any(match(p + 1, i) for i in range(k, len(key_words) + 1))
+        if k == len(key_words):
+            return False
+        return (word == '*' or word == key_words[k]) and match(p + 1, k + 1)
+
+    return match(0, 0)
+
+
+def done():
+    """
+    aio_pika returns tasks from ack/reject, so they may be awaited
+    """
+    future = asyncio.get_event_loop().create_future()
+    future.set_result(None)
+    return future
+
+
+class LoopbackProcessContext:
+    def __init__(self, message: 'LoopbackMessage', requeue=False):
+        self.message = message
+        self.requeue = requeue
+
+    async def __aenter__(self):
+        return self.message
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self.message.processed:
+            return
+        if exc_type:
+            self.message.reject(requeue=self.requeue)
+        else:
+            self.message.ack()
+
+
+class LoopbackMessage:
+    def __init__(self, message, routing_key, queue: 'LoopbackQueue' = None):
+        self.body = message.body
+        self.headers = dict(message.headers or {})
+        self.content_type = message.content_type
+        self.delivery_mode = message.delivery_mode
+        self.priority = message.priority
+        self.correlation_id = message.correlation_id
+        self.reply_to = message.reply_to
+        self.expiration = message.expiration
+        self.message_id = message.message_id
+        self.timestamp = message.timestamp
+        self.routing_key = routing_key
+        self.redelivered = False
+        self.queue = queue
+        self.processed = False
+
+    def process(self, requeue=False, **kwargs):
+        return LoopbackProcessContext(self, requeue=requeue)
+
+    def ack(self):
+        self.processed = True
+        return done()
+
+    def reject(self, requeue=False):
+        self.processed = True
+        if requeue and self.queue:
+            self.redelivered = True
+            self.processed = False
+            self.queue.put(self)
+        return done()
+
+
+class LoopbackQueue:
+    def __init__(self, name, arguments=None, channel: 'LoopbackChannel' = None):
+        self.name = name
+        self.arguments = arguments or {}
+        self.channel = channel
+        self.callback = None
+        self.prefetch_count = None
+        self.unacked = 0
+        self.pending = deque()
+
+    async def bind(self, exchange: 'LoopbackExchange', routing_key=None, **kwargs):
+        exchange.bindings.append((routing_key or self.name, self))
+
+    async def consume(self, callback, **kwargs):
+        self.callback = callback
+        # like with aio_pika, the consumer keeps the prefetch count its channel had when it started
+        self.prefetch_count = self.channel.prefetch_count if self.channel else None
+        while self.pending and not self.full:
+            self.put(self.pending.popleft())
+        return self.name
+
+    @property
+    def full(self) -> bool:
+        return bool(self.prefetch_count) and self.unacked >= self.prefetch_count
+
+    def put(self, message: LoopbackMessage):
+        if self.callback is None or self.full:
+            self.pending.append(message)
+            return
+        self.unacked += 1
+        asyncio.ensure_future(self._deliver(message))
+
+    async def _deliver(self, message: LoopbackMessage):
+        try:
+            await self.callback(message)
+        except Exception as e:
+            logger.error('Loopback consumer of `{}` failed: {!r}'.format(self.name, e))
+        finally:
+            self.unacked -= 1
+            if self.pending and not self.full:
+                self.put(self.pending.popleft())
+
+
+class LoopbackExchange:
+    def __init__(self, broker: 'LoopbackBroker', name, type='topic', arguments=None):
+        self.broker = broker
+        self.name = name
+        self.type = type
+        self.arguments = arguments or {}
+        self.bindings = []
+
+    def route(self, routing_key):
+        if not self.name:
+            queue = self.broker.queues.get(routing_key)
+            return [queue] if queue else []
+        return [
+            queue for pattern, queue in self.bindings
+            if topic_matches(pattern, routing_key)
+        ]
+
+    async def publish(self, message, routing_key, **kwargs):
+        delay = (message.headers or {}).get('x-delay') if self.type == 'x-delayed-message' else None
+        if delay:
+            loop = asyncio.get_event_loop()
+            loop.call_later(int(delay) / 1000, self._publish, message, routing_key)
+        else:
+            self._publish(message, routing_key)
+
+    def _publish(self, message, routing_key):
+        self.broker.published += 1
+        for queue in self.route(routing_key):
+            queue.put(LoopbackMessage(message, routing_key, queue))
+
+
+class LoopbackChannel:
+    def __init__(self, broker: 'LoopbackBroker'):
+        self.broker = broker
+        self.default_exchange = broker.default_exchange
+        self.prefetch_count = None
+
+    async def declare_exchange(self, name, type='topic', arguments=None, **kwargs):
+        if name not in self.broker.exchanges:
+            self.broker.exchanges[name] = LoopbackExchange(self.broker, name, type=type, arguments=arguments)
+        return self.broker.exchanges[name]
+
+    async def declare_queue(self, name=None, arguments=None, **kwargs):
+        name = name or 'loopback.gen-{}'.format(time.monotonic())
+        if name not in self.broker.queues:
+            self.broker.queues[name] = LoopbackQueue(name, arguments=arguments, channel=self)
+        return self.broker.queues[name]
+
+    async def set_qos(self, prefetch_count=0, **kwargs):
+        self.prefetch_count = prefetch_count
+
+    async def close(self):
+        pass
+
+
+class LoopbackConnection:
+    def __init__(self, broker: 'LoopbackBroker'):
+        self.broker = broker
+
+    async def channel(self, **kwargs):
+        return LoopbackChannel(self.broker)
+
+    async def close(self):
+        pass
+
+
+class LoopbackBroker:
+    """
+    Exchanges and queues shared by every pool connected to the same broker
+    """
+    def __init__(self):
+        self.exchanges = {}
+        self.queues = {}
+        self.default_exchange = LoopbackExchange(self, '', type='direct')
+        self.published = 0
+
+    async def connect(self, **kwargs) -> LoopbackConnection:
+        """
+        Drop-in replacement for `aio_pika.connect_robust`
+        """
+        return LoopbackConnection(self)
+
+
+async def connect_loopback(**kwargs) -> LoopbackConnection:
+    return await LoopbackBroker().connect(**kwargs)
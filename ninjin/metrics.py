@@ -0,0 +1,59 @@
+import contextlib
+import math
+import time
+from collections import deque
+
+
+def percentile(sorted_samples, q):
+    """
+    Nearest-rank percentile of already sorted samples
+    :param sorted_samples:
+    :param q: 0..100
+    :return:
+    """
+    if not sorted_samples:
+        return None
+    rank = max(int(math.ceil(q / 100.0 * len(sorted_samples))), 1)
+    return sorted_samples[rank - 1]
+
+
+@contextlib.contextmanager
+def timer(store: dict, name: str):
+    """
+    Adds the duration of the block (seconds) to `store[name]`
+    """
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        store[name] = store.get(name, 0) + time.monotonic() - started
+
+
+class Timings:
+    """
+    Collects durations (seconds) and reports a latency summary,
+    with `max_samples` only the latest samples are kept
+    """
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, max_samples: int = None):
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0
+
+    def __len__(self):
+        return len(self.samples)
+
+    def observe(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+
+    def summary(self) -> dict:
+        samples = sorted(self.samples)
+        result = {
+            'count': self.count,
+            'mean': sum(samples) / len(samples) if samples else None,
+            'max': samples[-1] if samples else None,
+        }
+        for q in self.PERCENTILES:
+            result['p{}'.format(q)] = percentile(samples, q)
+        return result
@@ -0,0 +1,87 @@
+"""
+Moves (de)serialization of large messages off the event loop.
+
+Schemas dump ORM rows, which stay in the process, so `serialize` always
+runs in threads. Envelope encoding and decoding only deal with plain
+data and bytes and go to the configured executor, threads or processes.
+"""
+import asyncio
+import concurrent.futures
+import functools
+from collections import Counter
+
+from ninjin import envelope
+
+THREAD = 'thread'
+PROCESS = 'process'
+
+
+def rows(data) -> int:
+    return len(data) if isinstance(data, list) else 1
+
+
+class Offloader:
+    def __init__(self,
+                 threshold_rows: int = None,
+                 threshold_bytes: int = None,
+                 executor: str = THREAD,
+                 max_workers: int = None):
+        """
+        :param threshold_rows: serialize and encode results of at least this many rows off the loop
+        :param threshold_bytes: decode bodies of at least this many bytes off the loop
+        :param executor: THREAD or PROCESS
+        :param max_workers: size of the pools, `concurrent.futures` default if None
+        """
+        if executor not in (THREAD, PROCESS):
+            raise ValueError('Unknown executor {}'.format(executor))
+        self.threshold_rows = threshold_rows
+        self.threshold_bytes = threshold_bytes
+        self.executor_type = executor
+        self.max_workers = max_workers
+        self.offloaded = Counter()
+        self._threads = None
+        self._executor = None
+
+    @property
+    def threads(self):
+        if self._threads is None:
+            self._threads = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._threads
+
+    @property
+    def executor(self):
+        if self.executor_type == THREAD:
+            return self.threads
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def large(self, data) -> bool:
+        return self.threshold_rows is not None and rows(data) >= self.threshold_rows
+
+    def large_body(self, body: bytes) -> bool:
+        return self.threshold_bytes is not None and len(body) >= self.threshold_bytes
+
+    async def run(self, name, executor, func, *args):
+        self.offloaded[name] += 1
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(executor, functools.partial(func, *args))
+
+    async def serialize(self, serialize, data):
+        if not self.large(data):
+            return serialize(data)
+        return await self.run('serialize', self.threads, serialize, data)
+
+    async def dumps(self, data: dict) -> bytes:
+        if not self.large(data.get('payload')):
+            return envelope.dumps(data)
+        return await self.run('dumps', self.executor, envelope.dumps, data)
+
+    async def loads(self, body: bytes) -> dict:
+        return await self.run('loads', self.executor, envelope.loads, body)
+
+    def close(self):
+        for executor in (self._threads, self._executor):
+            if executor is not None:
+                executor.shutdown(wait=False)
+        self._threads = self._executor = None
@@ -6,6 +6,14 @@ from ninjin.decorator import lazy
 
 
 class BasicOrdering:
+    __slots__ = (
+        'ordering_',
+        'allowed_ordering',
+        '_lazy_ordering',
+        '_lazy_applicable_ordering',
+        '_lazy_desc_ordering',
+    )
+
     def __init__(self, ordering: str, allowed_ordering: Iterable):
         self.ordering_ = ordering
         self.allowed_ordering = allowed_ordering or ()
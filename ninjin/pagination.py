@@ -1,6 +1,17 @@
 class BasicPagination:
-    items_per_page = 1
-    max_items_per_page = 100
+    # defaults when the resource doesn't pass its own, subclasses may
+    # still override them as `items_per_page` and `max_items_per_page`
+    ITEMS_PER_PAGE = 1
+    MAX_ITEMS_PER_PAGE = 100
+
+    __slots__ = (
+        'page',
+        'max_items_per_page',
+        'items_per_page',
+        'limit',
+        'offset',
+        'next',
+    )
 
     def __init__(self,
                  pagination: dict = None,
@@ -8,16 +19,29 @@ class BasicPagination:
                  max_items_per_page: int = None):
         pagination = pagination or {}
         self.page = pagination.get('page', 0)
-        self.max_items_per_page = max_items_per_page
+        self.max_items_per_page = max_items_per_page or self.default('max_items_per_page', self.MAX_ITEMS_PER_PAGE)
 
         self.items_per_page = min(
-            pagination.get('items_per_page', items_per_page),
+            pagination.get('items_per_page', items_per_page or self.default('items_per_page', self.ITEMS_PER_PAGE)),
             self.max_items_per_page
         )
         self.limit = (self.page + 1) * self.items_per_page
         self.offset = self.page * self.items_per_page
         self.next = False
 
+    @classmethod
+    def default(cls, name, fallback):
+        """
+        Class attribute `name` set by a subclass, `fallback` otherwise,
+        in BasicPagination itself the name belongs to the slot
+        """
+        for klass in cls.__mro__:
+            if klass is BasicPagination:
+                break
+            if name in vars(klass):
+                return vars(klass)[name]
+        return fallback
+
     def paginate(self, query):
         return query.limit(self.limit).offset(self.offset)
 
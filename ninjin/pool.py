@@ -1,9 +1,16 @@
 import asyncio
 import inspect
 import json
+import random
 import re
+import time
+import typing
 import uuid
-from collections import UserDict
+import zlib
+from collections import (
+    Counter,
+    UserDict
+)
 
 import aio_pika
 from aio_pika import (
@@ -12,31 +19,70 @@ from aio_pika import (
     Message
 )
 
+from ninjin import (
+    batch,
+    envelope
+)
+from ninjin.cache import (
+    STALE,
+    ResponseCache
+)
+from ninjin.coalescing import (
+    SingleFlight,
+    make_key
+)
+from ninjin.control import AdaptiveLimit
+from ninjin.database import Database
 from ninjin.exceptions import (
     ImproperlyConfigured,
     IncorrectMessage,
     UnknownConsumer
 )
 from ninjin.logger import logger
-from ninjin.schema import PayloadSchema
+from ninjin.metrics import timer
+from ninjin.offload import (
+    THREAD,
+    Offloader
+)
+from ninjin.routing import (
+    CONSISTENCY_KEY_HEADER,
+    READ_ONLY_HANDLERS,
+    READ_PRIMARY_HEADER,
+    RecentWrites,
+    ReplicaRouter
+)
+from ninjin.runtime import (
+    LagMonitor,
+    current_task,
+    task_name
+)
 
-schema = PayloadSchema()
 SCHEDULER_RESOURCE_NAME = '_scheduler'
+# unix time in milliseconds, clocks of publishers and consumers are expected to be in sync
+PUBLISHED_AT_HEADER = 'x-published-at'
+DEADLINE_HEADER = 'x-deadline'
+# service a delayed message is forwarded to
+FORWARD_HEADER = 'x-forward'
+EXPIRED = 'expired'
+SHED = 'shed'
 
 
-class QueuePool:
-    exchange = None
-    exchange_delayed = None
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def partition(key, partitions: int) -> int:
+    """
+    Stable over processes, unlike `hash`
+    """
+    return zlib.crc32(str(key).encode('utf-8')) % partitions
 
-    queues = {}
-    queue_main = None
-    queue_callback = None
-    queue_schedule = None
 
-    resources = {}
+def partition_name(consumer_key: str, index: int) -> str:
+    return '{}.{}'.format(consumer_key, index)
 
-    futures = {}
 
+class QueuePool:
     def __init__(self, pool: 'Pool',
                  exchange_name,
                  exchange_type='topic',
@@ -44,7 +90,24 @@ class QueuePool:
                  exchange_auto_delete=False):
         super().__init__()
         self.pool = pool
+        self.exchange = None
+        self.exchange_delayed = None
+        # {queue name: queue}
+        self.queues = {}
+        # names of the partition queues among `queues`
+        self.partition_queues = set()
+        self.queue_main = None
+        self.queue_callback = None
+        self.queue_schedule = None
+        # {resource name: registered resource class}
+        self.resources = {}
+        # {correlation id: future of the rpc reply}
+        self.futures = {}
         self.channel = pool.channel
+        # consumer queues are spread over the channels, so they are declared concurrently
+        self.channels = [pool.channel]
+        self.declarations = SingleFlight()
+        self.declared_queues = 0
         self.exchange_name = exchange_name
         self.exchange_type = exchange_type
         self.exchange_durable = exchange_durable
@@ -56,55 +119,121 @@ class QueuePool:
         self.delayed_name = '{}.delayed'.format(
             self.pool.service_name
         )
+        self.counters = Counter()
+        self.semaphore = asyncio.Semaphore(pool.concurrency) if pool.concurrency else None
+        self.limiter = None
+        if pool.target_latency:
+            # replaces the semaphore, consumers prefetch up to `max_concurrency` and the limit gates handling
+            self.semaphore = None
+            self.limiter = AdaptiveLimit(
+                initial=pool.concurrency or pool.min_concurrency,
+                min_limit=pool.min_concurrency,
+                max_limit=pool.max_concurrency,
+                target_latency=pool.target_latency,
+                max_error_rate=pool.max_error_rate
+            )
+        # {task: 'resource.handler'} while the lag monitor is on
+        self.running = {}
 
     async def connect(self):
-        if self.exchange_name:
-            self.exchange = await self.channel.declare_exchange(
-                name=self.exchange_name,
-                type=self.exchange_type,
-                durable=self.exchange_durable,
-                auto_delete=self.exchange_auto_delete
+        async def declare_exchange():
+            if self.exchange_name:
+                return await self.channel.declare_exchange(
+                    name=self.exchange_name,
+                    type=self.exchange_type,
+                    durable=self.exchange_durable,
+                    auto_delete=self.exchange_auto_delete
+                )
+            return self.channel.default_exchange
+
+        async def declare_callback():
+            self.exchange = await declare_exchange()
+            self.queue_callback = await self.channel.declare_queue(
+                name=self.rpc_name,
+                durable=False,
+                exclusive=True
+            )
+            await self.queue_callback.bind(self.exchange)
+
+        async def declare_schedule(channel):
+            self.exchange_delayed = await channel.declare_exchange(
+                name='{}.delayed'.format(
+                    self.exchange_name
+                ),
+                type='x-delayed-message',
+                arguments={
+                    'x-delayed-type': 'topic'
+                },
+                durable=True,
+                auto_delete=False
             )
-        else:
-            self.exchange = self.channel.default_exchange
 
-        self.queue_callback = await self.channel.declare_queue(
-            name=self.rpc_name,
-            durable=False,
-            exclusive=True
-        )
-        await self.queue_callback.bind(self.exchange)
+            self.queue_schedule = await channel.declare_queue(
+                name=self.delayed_name,
+                durable=True,
+                exclusive=False
+            )
+            await self.queue_schedule.bind(self.exchange_delayed)
 
-        self.exchange_delayed = await self.channel.declare_exchange(
-            name='{}.delayed'.format(
-                self.exchange_name
-            ),
-            type='x-delayed-message',
-            arguments={
-                'x-delayed-type': 'topic'
-            },
-            durable=True,
-            auto_delete=False
+        async def open_channels():
+            self.channels.extend(await asyncio.gather(*[
+                self.pool.connection.channel() for _ in range(self.pool.consumer_channels - 1)
+            ]))
+
+        await open_channels()
+        # the broker applies the prefetch count to consumers started afterwards only,
+        # so it can't follow the adaptive limit and is set to its upper bound
+        prefetch_count = self.pool.max_concurrency if self.limiter else self.pool.concurrency
+        await asyncio.gather(
+            declare_callback(),
+            declare_schedule(self.channels[-1]),
+            self.set_prefetch(prefetch_count)
         )
 
-        self.queue_schedule = await self.channel.declare_queue(
-            name=self.delayed_name,
+    async def set_prefetch(self, prefetch_count):
+        if prefetch_count:
+            await asyncio.gather(*[
+                channel.set_qos(prefetch_count=prefetch_count) for channel in self.channels
+            ])
+
+    def queue_names(self, consumer_key) -> list:
+        partitions = self.pool.partitions.get(consumer_key)
+        if not partitions:
+            return [consumer_key]
+        return [partition_name(consumer_key, index) for index in range(partitions)]
+
+    async def _declare_queues(self, consumer_key):
+        names = self.queue_names(consumer_key)
+        if self.pool.partitions.get(consumer_key):
+            self.partition_queues.update(names)
+        await asyncio.gather(*[self._declare_queue(name) for name in names])
+
+    async def _declare_queue(self, consumer_key):
+        arguments = {}
+        if self.pool.max_priority:
+            arguments['x-max-priority'] = self.pool.max_priority
+        if self.pool.dead_letter_exchange:
+            arguments['x-dead-letter-exchange'] = self.pool.dead_letter_exchange
+        if consumer_key in self.partition_queues:
+            # the broker delivers a partition to one consumer of all processes at a time
+            arguments['x-single-active-consumer'] = True
+        channel = self.channels[self.declared_queues % len(self.channels)]
+        self.declared_queues += 1
+        queue = await channel.declare_queue(
+            name=consumer_key,
             durable=True,
-            exclusive=False
+            arguments=arguments
         )
-        await self.queue_schedule.bind(self.exchange_delayed)
+        await queue.bind(self.exchange)
+        self.queues[consumer_key] = queue
 
     async def add_handler(self, consumer_key, resource):
         if not self.channel:
             raise ImproperlyConfigured('You must connect the broker first')
 
-        if consumer_key not in self.queues:
-            queue = await self.channel.declare_queue(
-                name=consumer_key,
-                durable=True
-            )
-            await queue.bind(self.exchange)
-            self.queues[consumer_key] = queue
+        if self.queue_names(consumer_key)[0] not in self.queues:
+            # resources sharing a consumer key wait for the same declaration
+            await self.declarations.do(consumer_key, lambda: self._declare_queues(consumer_key))
 
         resource_name = resource.resource_name()
 
@@ -114,8 +243,10 @@ class QueuePool:
         self.resources[resource_name] = resource
 
         # start scheduled tasks
-        for task in resource.periodic_tasks.values():
-            await task(resource(deserialized_data={}, message=None))
+        await asyncio.gather(*[
+            task(resource(deserialized_data={}, message=None))
+            for task in resource.periodic_tasks.values()
+        ])
 
     async def _on_rpc_response(self, message: IncomingMessage):
         async with message.process(requeue=False):
@@ -123,12 +254,21 @@ class QueuePool:
             try:
                 f = self.futures.pop(message.correlation_id)
                 f.set_result(json.loads(message.body.decode()))
-            except IndexError:
+            except KeyError:
                 pass
 
     async def _on_delayed_message(self, message: IncomingMessage):
         async with message.process(requeue=False):
-            deserialized_data = schema.loads(message.body)
+            headers = message.headers or {}
+            forward = headers.get(FORWARD_HEADER)
+            if forward is not None:
+                logger.debug(msg='Forwarding delayed message to {}'.format(forward))
+                # the body is republished as is, without parsing and encoding it again
+                await self.forward(forward, message.body, headers)
+                return
+
+            # scheduled before the forward header was introduced
+            deserialized_data = envelope.loads(message.body)
             logger.debug(msg='Received delayed message: {}'.format(deserialized_data))
             unwrapped_payload = deserialized_data.get('payload')
             # publish message to myself or neighbour
@@ -139,38 +279,161 @@ class QueuePool:
                 remote_resource=unwrapped_payload['resource']
             )
 
+    def shed_reason(self, message: IncomingMessage):
+        """
+        Nobody waits for the result of an expired or too old message
+        :param message:
+        :return: EXPIRED, SHED or None
+        """
+        headers = message.headers
+        if not headers:
+            return None
+        deadline = headers.get(DEADLINE_HEADER)
+        max_queue_age = self.pool.max_queue_age
+        if deadline is None and not max_queue_age:
+            return None
+        now = now_ms()
+        if deadline is not None and now > deadline:
+            return EXPIRED
+        published_at = headers.get(PUBLISHED_AT_HEADER)
+        if max_queue_age and published_at is not None and now - published_at > max_queue_age * 1000:
+            return SHED
+        return None
+
     async def _on_message(self, message: IncomingMessage):
+        self.counters['received'] += 1
+        reason = self.shed_reason(message)
+        if reason:
+            # checked before parsing the body, dead-lettered if the queue has a DLX
+            self.counters[reason] += 1
+            logger.debug(msg='Message {} is {}, dropped'.format(message.correlation_id, reason))
+            await message.reject(requeue=False)
+            return
+
         async with message.process(requeue=False):
-            deserialized_data = schema.loads(message.body)
+            if self.pool.offloader.large_body(message.body):
+                deserialized_data = envelope.Envelope(
+                    message.body, message.headers, data=await self.pool.offloader.loads(message.body)
+                )
+            else:
+                deserialized_data = envelope.Envelope(message.body, message.headers)
             logger.debug(msg='Received message: {}'.format(deserialized_data))
-            resource_name = deserialized_data.get('resource')
+            resource_name = deserialized_data.resource
+            if resource_name == batch.BATCH_RESOURCE_NAME:
+                return await self._on_batch(deserialized_data, message)
             try:
                 resource = self.resources[resource_name]
             except KeyError:
                 error_msg = 'Resource {} does not registered'.format(resource_name)
                 logger.info(error_msg)
                 raise UnknownConsumer(error_msg)
-            r = resource(deserialized_data, message)
-            await r.dispatch()
+            await self.handle(resource(deserialized_data, message))
 
-    async def publish(self, routing_key, data, **kwargs):
-        reply_to = self.rpc_name if 'correlation_id' in kwargs else None
-        period = data.get('period')
-        delay = period or data.get('delay')
-        delayed = period or delay
+    async def handle(self, resource):
+        if self.limiter is not None:
+            await self.limited(resource)
+        elif self.semaphore is None:
+            await self.dispatch(resource)
+        else:
+            async with self.semaphore:
+                await self.dispatch(resource)
+
+    async def _on_batch(self, deserialized_data, message: IncomingMessage):
+        """
+        Items are handled concurrently, each one like a separate message,
+        the reply lists their results in the same order
+        """
+        results = await asyncio.gather(*[
+            self._on_batch_item(item, message) for item in deserialized_data.get('batch') or ()
+        ])
+        self.counters['batch_items'] += len(results)
+        if message.reply_to:
+            await self.pool.publish(
+                results,
+                service_name=message.reply_to,
+                remote_resource=batch.BATCH_RESOURCE_NAME,
+                correlation_id=message.correlation_id,
+                priority=message.priority
+            )
+
+    async def _on_batch_item(self, item: dict, message: IncomingMessage) -> dict:
+        item_message = batch.BatchItemMessage(message)
+        try:
+            try:
+                resource = self.resources[item.get('resource')]
+            except KeyError:
+                raise UnknownConsumer('Resource {} does not registered'.format(item.get('resource')))
+            await self.handle(resource(item, item_message))
+        except Exception as e:
+            logger.info('Batch item {}.{} failed: {!r}'.format(item.get('resource'), item.get('handler'), e))
+            return batch.error(e)
+        return item_message.result()
+
+    async def limited(self, resource):
+        await self.limiter.acquire()
+        loop = asyncio.get_event_loop()
+        started = loop.time()
+        failed = True
+        try:
+            result = await self.dispatch(resource)
+            failed = False
+            return result
+        finally:
+            self.limiter.release(loop.time() - started, failed)
+
+    def describe(self, task) -> str:
+        return self.running.get(task) or task_name(task)
+
+    async def dispatch(self, resource):
+        if self.pool.lag_monitor is None:
+            return await resource.dispatch()
+        task = current_task()
+        self.running[task] = '{}.{}'.format(resource.resource_name(), resource.deserialized_data.get('handler'))
+        try:
+            return await resource.dispatch()
+        finally:
+            self.running.pop(task, None)
+
+    async def publish(self,
+                      routing_key,
+                      data,
+                      timeout: float = None,
+                      consistency_key=None,
+                      read_primary: bool = False,
+                      delay: int = None,
+                      **kwargs):
+        """
+        :param routing_key:
+        :param data:
+        :param timeout: seconds
+        :param consistency_key:
+        :param read_primary: a read-only actor has to run on the primary
+        :param delay: milliseconds, the message goes through the delayed exchange
+            and is forwarded to `routing_key` afterwards
+        :param kwargs: `aio_pika.Message` options
+        :return:
+        """
+        reply_to = self.rpc_name if kwargs.get('correlation_id') else None
 
         exchange = self.exchange
-        headers = {}
-        if delayed:
+        headers = envelope.routing_headers(data)
+        headers[PUBLISHED_AT_HEADER] = now_ms()
+        if timeout:
+            headers[DEADLINE_HEADER] = headers[PUBLISHED_AT_HEADER] + int(timeout * 1000)
+            kwargs['expiration'] = timeout
+        if consistency_key:
+            headers[CONSISTENCY_KEY_HEADER] = str(consistency_key)
+        if read_primary:
+            headers[READ_PRIMARY_HEADER] = 1
+        if delay:
             exchange = self.exchange_delayed
-            headers = {
-                'x-delay': delay
-            }
+            headers['x-delay'] = delay
+            headers[FORWARD_HEADER] = routing_key
             routing_key = self.delayed_name
 
         await exchange.publish(
             Message(
-                body=schema.dumps(data),
+                body=await self.pool.offloader.dumps(data),
                 content_type="application/json",
                 delivery_mode=DeliveryMode.PERSISTENT,
                 reply_to=reply_to,
@@ -180,12 +443,45 @@ class QueuePool:
             routing_key=routing_key
         )
 
+    async def forward(self, routing_key, body: bytes, headers):
+        forwarded_headers = {
+            header: headers[header] for header in envelope.ROUTING_HEADERS.values() if header in headers
+        }
+        forwarded_headers[PUBLISHED_AT_HEADER] = now_ms()
+        await self.exchange.publish(
+            Message(
+                body=body,
+                content_type="application/json",
+                delivery_mode=DeliveryMode.PERSISTENT,
+                headers=forwarded_headers
+            ),
+            routing_key=routing_key
+        )
+
+    def sequential(self, callback):
+        """
+        Messages of a partition are handled one by one in the order of delivery,
+        partitions run concurrently. Other processes don't receive messages of the
+        partition meanwhile, its queue has a single active consumer
+        """
+        lock = asyncio.Lock()
+
+        async def wrapper(message: IncomingMessage):
+            async with lock:
+                await callback(message)
+        return wrapper
+
+    def consumer(self, queue_name):
+        if queue_name in self.partition_queues:
+            return self.sequential(self._on_message)
+        return self._on_message
+
     async def consume(self):
         await asyncio.gather(
             *[
                 self.queue_callback.consume(callback=self._on_rpc_response),
                 self.queue_schedule.consume(callback=self._on_delayed_message),
-                *[queue.consume(callback=self._on_message) for queue in self.queues.values()],
+                *[queue.consume(callback=self.consumer(name)) for name, queue in self.queues.items()],
             ]
         )
 
@@ -209,6 +505,29 @@ class Pool(UserDict):
                  login='guest',
                  password='guest',
                  exchange_name=None,
+                 connection_factory=None,
+                 rpc_cache: ResponseCache = None,
+                 max_priority: int = None,
+                 rpc_priority: int = None,
+                 max_queue_age: float = None,
+                 dead_letter_exchange: str = None,
+                 consumer_channels: int = 1,
+                 reconnect_delay: float = 1,
+                 reconnect_max_delay: float = 30,
+                 concurrency: int = None,
+                 offload_rows: int = None,
+                 offload_bytes: int = None,
+                 offload_executor: str = THREAD,
+                 offload_workers: int = None,
+                 loop_lag_threshold: float = None,
+                 loop_lag_interval: float = 0.05,
+                 partitions: typing.Dict[str, int] = None,
+                 partition_field: str = 'id',
+                 target_latency: float = None,
+                 min_concurrency: int = 1,
+                 max_concurrency: int = None,
+                 max_error_rate: float = 0.05,
+                 read_your_writes: float = 0,
                  *args, **kwargs):
         """
         :return:
@@ -219,6 +538,37 @@ class Pool(UserDict):
         :param login:
         :param password:
         :param exchange_name:
+        :param connection_factory: coroutine used instead of `aio_pika.connect_robust`,
+            e.g. `ninjin.loopback.connect_loopback`
+        :param rpc_cache: cache for `rpc` replies
+        :param max_priority: declare consumer queues as priority queues (`x-max-priority`)
+        :param rpc_priority: default priority of `rpc` requests
+        :param max_queue_age: drop messages which waited in the queue longer (seconds)
+        :param dead_letter_exchange: expired and shed messages are dead-lettered there
+        :param consumer_channels: channels to spread consumer queues over
+        :param reconnect_delay: first delay (seconds) between connection attempts
+        :param reconnect_max_delay: the delay doubles up to this value
+        :param concurrency: messages handled at once, also the prefetch count of every channel
+        :param offload_rows: serialize and encode replies of at least this many rows in an executor
+        :param offload_bytes: decode received bodies of at least this size in an executor
+        :param offload_executor: `ninjin.offload.THREAD` or `ninjin.offload.PROCESS`
+        :param offload_workers: size of the executor
+        :param loop_lag_threshold: seconds, enables the event loop lag monitor,
+            longer blocks are logged with the name of the running handler
+        :param loop_lag_interval: seconds between lag samples
+        :param partitions: {consumer_key: number of partition queues}, messages with equal
+            partition keys go to the same partition and are handled in the order of publishing.
+            Publishers and consumers need the same value
+        :param partition_field: payload field used as the partition key by default
+        :param target_latency: seconds, enables the adaptive concurrency limit: it grows
+            while p95 handling time stays below and shrinks when it is exceeded
+        :param min_concurrency: lower bound of the adaptive limit
+        :param max_concurrency: upper bound of the adaptive limit and the prefetch count of every
+            channel when the limit is on, 100 by default
+        :param max_error_rate: the adaptive limit shrinks when more handlers fail
+        :param read_your_writes: seconds after this pool called an actor which may write
+            with a `consistency_key` when read-only actors called with the same key
+            still run on the primary database
         :param exchange_type:
         :param exchange_durable:
         :param exchange_auto_delete:
@@ -233,6 +583,47 @@ class Pool(UserDict):
         self.login = login
         self.password = password
         self.exchange_name = exchange_name
+        self.connection_factory = connection_factory or aio_pika.connect_robust
+        self.single_flight = SingleFlight()
+        self.rpc_cache = rpc_cache
+        self.max_priority = max_priority
+        self.rpc_priority = rpc_priority
+        # default priorities of known actors, {(resource_name, handler_name): priority}
+        self.priorities = {}
+        # {(resource_name, handler_name): read_only} of known actors
+        self.read_only_actors = {}
+        self.recent_writes = RecentWrites(read_your_writes) if read_your_writes else None
+        self.max_queue_age = max_queue_age
+        self.dead_letter_exchange = dead_letter_exchange
+        self.consumer_channels = max(consumer_channels, 1)
+        self.reconnect_delay = reconnect_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        # seconds spent in every startup phase
+        self.startup_timings = {}
+        self.concurrency = concurrency
+        self.target_latency = target_latency
+        self.min_concurrency = max(min_concurrency, 1)
+        self.max_concurrency = max_concurrency or max(concurrency or 0, 100)
+        self.max_error_rate = max_error_rate
+        self.db = None
+        self.router = None
+        # set by `bind_db`
+        self.database = None
+        self.offloader = Offloader(
+            threshold_rows=offload_rows,
+            threshold_bytes=offload_bytes,
+            executor=offload_executor,
+            max_workers=offload_workers
+        )
+        self.partitions = partitions or {}
+        self.partition_field = partition_field
+        self.lag_monitor = None
+        if loop_lag_threshold is not None:
+            self.lag_monitor = LagMonitor(
+                interval=loop_lag_interval,
+                threshold=loop_lag_threshold,
+                describe=lambda task: self.queues.describe(task) if self.queues else task_name(task)
+            )
 
     async def __aenter__(self):
         # TODO
@@ -250,30 +641,80 @@ class Pool(UserDict):
             port=self.port,
             login=self.login
         )
-        try:
-            connection = await aio_pika.connect_robust(
-                password=self.password,
-                loop=loop,
-                **credentials
+        delay = self.reconnect_delay
+        with timer(self.startup_timings, 'connect'):
+            while True:
+                try:
+                    connection = await self.connection_factory(
+                        password=self.password,
+                        loop=loop,
+                        **credentials
+                    )
+                    break
+                except ConnectionError as e:
+                    logger.error(msg='{e}, {login}@{host}:{port}'.format(
+                        e=e, **credentials
+                    ))
+                    # full jitter keeps restarted pods from reconnecting in lockstep
+                    await asyncio.sleep(random.uniform(0, delay))
+                    delay = min(delay * 2, self.reconnect_max_delay)
+
+        with timer(self.startup_timings, 'declare'):
+            self.connection = connection
+            self.channel = await connection.channel()
+            self.queues = QueuePool(
+                pool=self,
+                exchange_name=self.exchange_name
             )
-        except ConnectionError as e:
-            logger.error(msg='{e}, {login}@{host}:{port}'.format(
-                e=e, **credentials
-            ))
-            await asyncio.sleep(5)
-            return await self.connect()
-
-        self.connection = connection
-        self.channel = await connection.channel()
-        self.queues = QueuePool(
-            pool=self,
-            exchange_name=self.exchange_name
-        )
-        await self.queues.connect()
+            await self.queues.connect()
+        if self.lag_monitor is not None:
+            self.lag_monitor.start()
 
     async def close(self):
+        if self.lag_monitor is not None:
+            self.lag_monitor.stop()
+        if self.database is not None:
+            await self.database.close()
+        self.offloader.close()
         await self.connection.close()
 
+    async def bind_db(self,
+                      db,
+                      bind,
+                      replicas: typing.Iterable[str] = (),
+                      health_check_interval: float = 5,
+                      **kwargs):
+        """
+        Binds GINO with a connection pool sized for `concurrency`,
+        afterwards actors of transactional resources run in their own transactions
+        :param db: `gino.Gino` instance
+        :param bind: DSN or URL
+        :param replicas: DSNs of read replicas, read-only actors run there,
+            callers set `read_your_writes` to read their own writes
+        :param health_check_interval: seconds between replica health checks
+        :param kwargs: engine options, e.g. `min_size`, `max_size`
+        :return: engine
+        """
+        if self.target_latency:
+            # the adaptive limit may grow up to `max_concurrency`
+            kwargs.setdefault('max_size', self.max_concurrency)
+            kwargs.setdefault('min_size', min(self.concurrency or self.min_concurrency, kwargs['max_size']))
+        elif self.concurrency:
+            kwargs.setdefault('max_size', self.concurrency)
+            kwargs.setdefault('min_size', min(self.concurrency, kwargs['max_size']))
+        engine = await db.set_bind(bind, **kwargs)
+        self.db = db
+        if replicas:
+            from gino import create_engine
+            self.router = ReplicaRouter(
+                primary=db,
+                replicas=await asyncio.gather(*[create_engine(dsn, **kwargs) for dsn in replicas]),
+                health_check_interval=health_check_interval
+            )
+            self.router.start()
+        self.database = Database(db, self.router)
+        return engine
+
     def register_function(self, handler, consumer_key=None, handler_name=None):
         if not inspect.iscoroutinefunction(handler):
             raise ImproperlyConfigured('Only coroutine can be registered')
@@ -283,15 +724,36 @@ class Pool(UserDict):
         # self[consumer_key][resource_name] = type('SimpleResource', (Resource,), {handler_name: handler})
 
     async def register(self, resource: 'Resource', consumer_key=None):
+        with timer(self.startup_timings, 'register'):
+            await self._register(resource, consumer_key)
+
+    async def register_many(self, resources: typing.Iterable['Resource'], consumer_key=None):
+        """
+        Declares queues and starts periodic tasks of all resources concurrently
+        :param resources:
+        :param consumer_key:
+        :return:
+        """
+        with timer(self.startup_timings, 'register'):
+            await asyncio.gather(*[
+                self._register(resource, consumer_key=consumer_key) for resource in resources
+            ])
+
+    async def _register(self, resource: 'Resource', consumer_key=None):
         actors = {}
         periodic_tasks = {}
 
         for att in map(lambda x: getattr(resource, x), dir(resource)):
             if getattr(att, 'is_actor', False) is True:
                 actors[att.__name__] = att
+                self.read_only_actors[(resource.resource_name(), att.__name__)] = att.read_only
+                if getattr(att, 'priority', None) is not None:
+                    self.priorities[(resource.resource_name(), att.__name__)] = att.priority
             if getattr(att, 'is_periodic_task', False) is True:
                 periodic_tasks[att.__name__] = att
+        # without `__dict__` when the registered class and its bases declare `__slots__`
         resource = type(resource.__name__, (resource,), {
+            '__slots__': (),
             'pool': self,
             'actors': actors,
             'periodic_tasks': periodic_tasks
@@ -300,7 +762,46 @@ class Pool(UserDict):
         await self.queues.add_handler(consumer_key, resource)
 
     async def start(self):
-        await self.queues.consume()
+        with timer(self.startup_timings, 'consume'):
+            await self.queues.consume()
+        logger.info('Startup timings: {}'.format(', '.join(
+            '{} {:.3f}s'.format(phase, duration) for phase, duration in self.startup_timings.items()
+        )))
+
+    def stats(self) -> dict:
+        stats = {
+            'messages': dict(self.queues.counters) if self.queues else {},
+            'startup': dict(self.startup_timings),
+            'single_flight': {
+                'executed': self.single_flight.executed,
+                'coalesced': self.single_flight.coalesced,
+            },
+        }
+        if self.lag_monitor is not None:
+            stats['loop'] = self.lag_monitor.stats()
+        if self.queues and self.queues.limiter is not None:
+            stats['concurrency'] = self.queues.limiter.stats()
+        if self.offloader.offloaded:
+            stats['offloaded'] = dict(self.offloader.offloaded)
+        if self.rpc_cache:
+            stats['rpc_cache'] = self.rpc_cache.stats()
+        if self.database is not None:
+            stats['db'] = self.database.stats()
+        return stats
+
+    def routing_key(self, service_name: str, payload, partition_key=None) -> str:
+        """
+        The partition queue for partitioned services, messages without a key
+        are spread over the partitions randomly
+        """
+        partitions = self.partitions.get(service_name)
+        if not partitions:
+            return service_name
+        if partition_key is None and isinstance(payload, dict):
+            partition_key = payload.get(self.partition_field)
+        if partition_key is None:
+            return partition_name(service_name, random.randrange(partitions))
+        return partition_name(service_name, partition(partition_key, partitions))
 
     async def publish(
             self,
@@ -310,6 +811,13 @@ class Pool(UserDict):
             remote_handler='default',
             correlation_id=None,
             pagination=None,
+            filtering=None,
+            ordering=None,
+            priority: int = None,
+            fields=None,
+            timeout: float = None,
+            consistency_key=None,
+            partition_key=None,
     ):
         """
         publish message to queue.
@@ -321,6 +829,13 @@ class Pool(UserDict):
         :param remote_handler:
         :param correlation_id:
         :param pagination:
+        :param filtering:
+        :param ordering:
+        :param priority: overrides the default priority of the remote actor
+        :param fields: columns to select, the remote resource must allow them
+        :param timeout: seconds, the message expires and is not handled afterwards
+        :param consistency_key: e.g. user id, reads follow writes with the same key
+        :param partition_key: defaults to the `partition_field` of the payload
         :return:
         """
         if payload is None:
@@ -332,28 +847,149 @@ class Pool(UserDict):
             handler=remote_handler,
             pagination=pagination,
         )
+        if filtering is not None:
+            data['filtering'] = filtering
+        if ordering is not None:
+            data['ordering'] = ordering
+        if fields is not None:
+            data['fields'] = list(fields)
+        if priority is None:
+            priority = self.priorities.get((remote_resource, remote_handler))
         await self.queues.publish(
-            routing_key=service_name,
+            routing_key=self.routing_key(service_name, payload, partition_key),
             data=data,
             correlation_id=correlation_id,
+            priority=priority,
+            timeout=timeout,
+            consistency_key=consistency_key,
+            read_primary=self.read_primary(remote_resource, remote_handler, consistency_key),
         )
 
+    def read_primary(self, remote_resource, remote_handler, consistency_key) -> bool:
+        """
+        Records calls of actors which may write, reads with the same consistency key
+        within `read_your_writes` seconds go to the primary
+        """
+        if self.recent_writes is None or not consistency_key:
+            return False
+        read_only = self.read_only_actors.get((remote_resource, remote_handler), remote_handler in READ_ONLY_HANDLERS)
+        if not read_only:
+            self.recent_writes.write(consistency_key)
+            return False
+        return self.recent_writes.pinned(consistency_key)
+
     async def rpc(
             self,
             payload,
             service_name: str = None,
             remote_resource=None,
-            remote_handler='default'
+            remote_handler='default',
+            filtering=None,
+            ordering=None,
+            pagination=None,
+            cache: bool = None,
+            priority: int = None,
+            fields=None,
+            timeout: float = None,
+            consistency_key=None,
+            partition_key=None,
     ):
-        future, correlation_id = await self.queues.future()
-        await self.publish(
-            payload,
-            service_name=service_name,
-            remote_resource=remote_resource,
-            remote_handler=remote_handler,
-            correlation_id=correlation_id
+        """
+        :param payload:
+        :param service_name:
+        :param remote_resource:
+        :param remote_handler:
+        :param filtering:
+        :param ordering:
+        :param pagination:
+        :param cache: use `rpc_cache` for this call, by default only for resources listed in its TTLs
+        :param priority: overrides the default priority of the remote actor and `rpc_priority`
+        :param fields: columns to select, the remote resource must allow them
+        :param timeout: seconds to wait for the reply, the request expires as well
+        :param consistency_key: e.g. user id, reads follow writes with the same key
+        :param partition_key: defaults to the `partition_field` of the payload
+        :return:
+        """
+        if priority is None:
+            priority = self.priorities.get((remote_resource, remote_handler), self.rpc_priority)
+
+        async def call():
+            future, correlation_id = await self.queues.future()
+            try:
+                await self.publish(
+                    payload,
+                    service_name=service_name,
+                    remote_resource=remote_resource,
+                    remote_handler=remote_handler,
+                    correlation_id=correlation_id,
+                    pagination=pagination,
+                    filtering=filtering,
+                    ordering=ordering,
+                    priority=priority,
+                    fields=fields,
+                    timeout=timeout,
+                    consistency_key=consistency_key,
+                    partition_key=partition_key,
+                )
+                return await asyncio.wait_for(future, timeout)
+            finally:
+                self.queues.futures.pop(correlation_id, None)
+
+        if not self.rpc_cache or not self.rpc_cache.enabled_for(remote_resource, cache):
+            return await call()
+
+        key = make_key(
+            service_name, remote_resource, remote_handler, payload, filtering, ordering, pagination, fields
         )
-        return await future
+        reply, state = self.rpc_cache.get(key, remote_resource)
+        if state == STALE:
+            self.rpc_cache.revalidate(key, call)
+        if state is not None:
+            return reply
+        return await self.rpc_cache.fetch(key, call)
+
+    async def batch(
+            self,
+            requests: typing.Iterable[dict],
+            service_name: str,
+            priority: int = None,
+            timeout: float = None,
+    ) -> list:
+        """
+        Sends several requests in one message, the service handles them concurrently
+        and sends one reply. Items of a batch to a partitioned service are not ordered
+        against other messages
+        :param requests: dicts with `resource`, `handler` and optional `payload`,
+            `filtering`, `ordering`, `pagination`, `fields`
+        :param service_name:
+        :param priority:
+        :param timeout: seconds to wait for the reply, the request expires as well
+        :return: `{'status': 'ok', 'payload': ..., 'pagination': ...}` or
+            `{'status': 'error', 'error': ...}` per request, in the same order
+        """
+        requests = [
+            {key: value for key, value in request.items() if value is not None} for request in requests
+        ]
+        for request in requests:
+            request.setdefault('handler', 'default')
+        future, correlation_id = await self.queues.future()
+        try:
+            await self.queues.publish(
+                routing_key=self.routing_key(service_name, None),
+                data=dict(
+                    payload={},
+                    resource=batch.BATCH_RESOURCE_NAME,
+                    handler=batch.BATCH_RESOURCE_NAME,
+                    batch=requests,
+                ),
+                correlation_id=correlation_id,
+                priority=priority if priority is not None else self.rpc_priority,
+                timeout=timeout,
+            )
+            reply = await asyncio.wait_for(future, timeout)
+        finally:
+            self.queues.futures.pop(correlation_id, None)
+        return reply['payload']
 
     async def schedule(
             self,
@@ -372,18 +1008,9 @@ class Pool(UserDict):
             resource=remote_resource,
             handler=remote_handler,
         )
-
-        wrapped_message = dict(
-            payload=message_to_proceed,
-            resource=SCHEDULER_RESOURCE_NAME,
-            handler=SCHEDULER_RESOURCE_NAME,
-
-            delay=period or delay,
-            forward=service_name,
-            period=period
-        )
-        # publish message to myself
+        # the delayed queue forwards the message body untouched to `service_name`
         await self.queues.publish(
-            routing_key=self.service_name,
-            data=wrapped_message
+            routing_key=self.routing_key(service_name, payload),
+            data=message_to_proceed,
+            delay=period or delay
         )
@@ -1,10 +1,17 @@
 import operator
 import re
+from types import MappingProxyType
 from typing import Iterable
 
 from aio_pika import IncomingMessage
 from gino import NoResultFound
+from sqlalchemy import (
+    func,
+    select
+)
 
+from ninjin.aggregation import BasicAggregation
+from ninjin.coalescing import make_key
 from ninjin.decorator import (
     actor,
     lazy
@@ -20,16 +27,42 @@ from ninjin.filtering import (
 from ninjin.logger import logger
 from ninjin.ordering import BasicOrdering
 from ninjin.pagination import BasicPagination
-from ninjin.schema import IdSchema
+from ninjin.routing import (
+    CONSISTENCY_KEY_HEADER,
+    READ_PRIMARY_HEADER
+)
+from ninjin.schema import (
+    IdSchema,
+    schema_instance
+)
+
+# interactive reads overtake queued writes when the queue has `x-max-priority`
+READ_PRIORITY = 5
 
 
 class Resource():
+    # one instance per message, `connection` is the connection of the message
+    # transaction when the pool is bound to a database. Subclasses declare
+    # `__slots__ = ()` (plus `_lazy_<name>` of their own lazy values) to keep
+    # instances without a `__dict__`
+    __slots__ = (
+        'deserialized_data',
+        'message',
+        'connection',
+        '_handler',
+        '_lazy_raw',
+        '_lazy_payload',
+    )
+
     pool = None
     consumer_key = None
     serializer_class = None
     deserializer_class = None
-    actors = {}
-    periodic_tasks = {}
+    # actors get a connection and a transaction once the pool is bound to a database
+    transactional = False
+    # filled per registered class by `Pool.register`
+    actors = MappingProxyType({})
+    periodic_tasks = MappingProxyType({})
 
     @classmethod
     def resource_name(cls):
@@ -41,8 +74,17 @@ class Resource():
     def __init__(self, deserialized_data, message: IncomingMessage):
         self.deserialized_data = deserialized_data
         self.message = message
-        self.raw = deserialized_data.get('payload', {})
-        self.payload = None
+        self.connection = None
+        self._handler = None
+
+    @lazy
+    def raw(self):
+        # the body of a received message is parsed here, handlers which don't read it never parse it
+        return self.deserialized_data.get('payload', {})
+
+    @lazy
+    def payload(self):
+        return self.deserialize(self.raw)
 
     async def filter(self, *args, **kwargs):
         raise NotImplementedError()
@@ -53,10 +95,31 @@ class Resource():
     async def order(self, *args, **kwargs):
         raise NotImplementedError()
 
-    def serialize(self, data: [dict, Iterable]) -> dict:
-        if not self.serializer_class:
+    def coalesce_key(self, handler_name: str):
+        """
+        Requests with equal keys are executed once while in flight,
+        None disables coalescing
+        :param handler_name:
+        :return:
+        """
+        return None
+
+    def get_serializer_class(self):
+        # the actor being dispatched may override the class of the resource
+        return getattr(self._handler, 'serializer_class', self.serializer_class)
+
+    def get_deserializer_class(self):
+        return getattr(self._handler, 'deserializer_class', self.deserializer_class)
+
+    def serialize(self, data: [dict, Iterable], only: tuple = None) -> dict:
+        serializer_class = self.get_serializer_class()
+        if not serializer_class:
             return data
-        return self.serializer_class(many=isinstance(data, list)).dump(data)
+        if only:
+            # marshmallow rejects `only` fields the schema doesn't declare
+            declared = serializer_class._declared_fields
+            only = tuple(field for field in only if field in declared) or None
+        return schema_instance(serializer_class, many=isinstance(data, list), only=only).dump(data)
 
     def deserialize(self, data: dict) -> dict:
         """
@@ -64,9 +127,10 @@ class Resource():
         :param data:
         :return:
         """
-        if not self.deserializer_class:
+        deserializer_class = self.get_deserializer_class()
+        if not deserializer_class:
             return data
-        return self.deserializer_class().load(data)
+        return deserializer_class().load(data)
 
     def validate(self, data: dict):
         """
@@ -74,11 +138,38 @@ class Resource():
         :param data:
         :return:
         """
-        if self.serializer_class:
-            errors = self.serializer_class.validate(data)
+        serializer_class = self.get_serializer_class()
+        if serializer_class:
+            errors = serializer_class.validate(data)
             if errors:
                 raise ValidationError('Deserialization Error: {}'.format(errors))
 
+    async def execute(self, call):
+        """
+        Runs the body of an actor, in a transaction of its own when the resource
+        is `transactional` and the pool is bound to a database
+        :param call: coroutine function
+        :return:
+        """
+        database = getattr(self.pool, 'database', None)
+        if database is None or not self.transactional:
+            return await call()
+        return await database.transaction(self, call)
+
+    async def reply(self, payload, pagination=None, **kwargs):
+        """
+        Publishes the reply of an actor, replies to batch items are collected by the batch
+        """
+        collect = getattr(self.message, 'collect', None)
+        if collect is not None:
+            return collect(payload, pagination)
+        await self.pool.publish(payload, pagination=pagination, **kwargs)
+
+    @property
+    def read_only(self) -> bool:
+        handler = self.actors.get(self.deserialized_data.get('handler'))
+        return getattr(handler, 'read_only', False)
+
     async def dispatch(self):
         handler_name = self.deserialized_data['handler']
         handler = self.actors.get(handler_name, self.periodic_tasks.get(handler_name))
@@ -87,41 +178,67 @@ class Resource():
                 handler_name,
                 self.__class__.__name__
             ))
-        self.serializer_class = getattr(handler, 'serializer_class', self.serializer_class)
-        self.deserializer_class = getattr(handler, 'deserializer_class', self.deserializer_class)
-        self.payload = self.deserialize(self.raw)
+        self._handler = handler
         return await handler(self)
 
 
 class ModelResource(Resource):
+    __slots__ = (
+        '_lazy_filtering',
+        '_lazy_ordering',
+        '_lazy_pagination',
+        '_lazy__db',
+        '_lazy__table',
+        '_lazy__primary_key',
+        '_lazy_selected_fields',
+        '_lazy_query',
+        '_lazy_ident',
+    )
+
     model = None
+    transactional = True
     serializer_class = IdSchema
     deserializer_class = serializer_class
     filtering_class = BasicFiltering
     pagination_class = BasicPagination
     ordering_class = BasicOrdering
+    aggregation_class = BasicAggregation
     allowed_filters = {
         'id': ALL
     }
     allowed_ordering = None
+    # columns callers may select with `fields`, None disables the selection
+    allowed_fields = None
+    # actors which don't return rows, they count and aggregate over every column
+    unprojected_actors = ('count', 'aggregate')
+    # {'funds': (SUM, AVG)}, see `ninjin.aggregation`
+    allowed_aggregates = {}
+    allowed_group_by = ()
     items_per_page = 100
     max_items_per_page = 1000
+    # collapse concurrent identical reads into one query
+    coalesce_reads = False
+    coalesced_actors = ('get', 'get_list', 'count', 'aggregate')
 
-    def __init__(self, deserialized_data, message: IncomingMessage):
-        super().__init__(deserialized_data, message)
-        self.filtering = self.payload
-
-        self.filtering = self.filtering_class(
+    @lazy
+    def filtering(self):
+        return self.filtering_class(
             self.model,
-            filtering=deserialized_data.get('filtering'),
+            filtering=self.deserialized_data.get('filtering'),
             allowed_filters=self.allowed_filters
         )
-        self.ordering = self.ordering_class(
-            ordering=deserialized_data.get('ordering'),
+
+    @lazy
+    def ordering(self):
+        return self.ordering_class(
+            ordering=self.deserialized_data.get('ordering'),
             allowed_ordering=self.allowed_ordering
         )
-        self.pagination = self.pagination_class(
-            deserialized_data.get('pagination'),
+
+    @lazy
+    def pagination(self):
+        return self.pagination_class(
+            self.deserialized_data.get('pagination'),
             items_per_page=self.items_per_page,
             max_items_per_page=self.max_items_per_page
         )
@@ -130,6 +247,13 @@ class ModelResource(Resource):
     def _db(self):
         return self.model.__metadata__
 
+    @property
+    def bind(self):
+        """
+        Connection of the message, it may belong to a read replica
+        """
+        return self.connection if self.connection is not None else self._db
+
     @lazy
     def _table(self):
         return self._db.tables[self.model.__tablename__]
@@ -138,6 +262,25 @@ class ModelResource(Resource):
     def _primary_key(self):
         return self._table.primary_key.columns.keys()[0]
 
+    def coalesce_key(self, handler_name: str):
+        if not self.coalesce_reads or handler_name not in self.coalesced_actors:
+            return None
+        headers = getattr(self.message, 'headers', None) or {}
+        if headers.get(READ_PRIMARY_HEADER):
+            # an identical read in flight may have started before the write of the caller
+            return None
+        consistency_key = headers.get(CONSISTENCY_KEY_HEADER)
+        return make_key(
+            self.resource_name(),
+            handler_name,
+            self.deserialized_data.get('payload'),
+            self.deserialized_data.get('filtering'),
+            self.deserialized_data.get('ordering'),
+            self.deserialized_data.get('pagination'),
+            self.selected_fields,
+            consistency_key,
+        )
+
     def filter(self, query):
         return self.filtering.filter(query)
 
@@ -147,13 +290,43 @@ class ModelResource(Resource):
     def order(self, query):
         return self.ordering.order_by(query)
 
+    @lazy
+    def selected_fields(self):
+        """
+        Requested `fields` which are allowed and serialized, the primary key is always selected
+        :return: sorted tuple or None if every column should be selected
+        """
+        requested = self.deserialized_data.get('fields')
+        if not requested or not self.allowed_fields:
+            return None
+        if self.deserialized_data.get('handler') in self.unprojected_actors:
+            return None
+        serializer_class = self.get_serializer_class()
+        declared = serializer_class._declared_fields if serializer_class else None
+        selected = {
+            field for field in requested
+            if field in self.allowed_fields and (declared is None or field in declared)
+        }
+        if not selected:
+            return None
+        selected.add(self._primary_key)
+        return tuple(sorted(selected))
+
+    def select(self):
+        if self.selected_fields:
+            return self.model.load(*self.selected_fields).query
+        return self.model.query
+
+    def serialize(self, data: [dict, Iterable], only: tuple = None) -> dict:
+        return super().serialize(data, only=only or self.selected_fields)
+
     @lazy
     def query(self):
         """
         To provide an easy inheritance
         :return:
         """
-        return self.filter(self.model.query)
+        return self.filter(self.select())
 
     @lazy
     def ident(self):
@@ -163,7 +336,7 @@ class ModelResource(Resource):
             return self.filtering.filtering.get(self._primary_key)
 
     async def exists(self, expr):
-        return await self._db.scalar(self._db.exists().where(
+        return await self.bind.scalar(self._db.exists().where(
             expr
         ).select())
 
@@ -211,19 +384,48 @@ class ModelResource(Resource):
     async def perform_get(self):
         try:
             expr = operator.eq(getattr(self.model, self._primary_key), self.ident)
-            return await self.query.where(expr).gino.one()
+            return await self.bind.one(self.query.where(expr))
         except NoResultFound:
             return None
 
-    @actor()
+    @actor(priority=READ_PRIORITY, read_only=True)
     async def get(self):
         return await self.perform_get()
 
     async def perform_get_list(self):
         query = self.order(self.query)
         query = self.paginate(query)
-        return await query.gino.all()
+        return await self.bind.all(query)
 
-    @actor()
+    @actor(priority=READ_PRIORITY, read_only=True)
     async def get_list(self):
         return await self.perform_get_list()
+
+    async def perform_count(self):
+        # counts what `get_list` would return, `query` may be narrowed by subclasses
+        query = select([func.count()]).select_from(self.query.alias('counted'))
+        return await self.bind.scalar(query)
+
+    @actor(serializer_class=None, deserializer_class=None, priority=READ_PRIORITY, read_only=True)
+    async def count(self):
+        return {'count': await self.perform_count()}
+
+    async def perform_aggregate(self):
+        aggregation = self.aggregation_class(
+            self.model,
+            aggregates=self.payload.get('aggregates'),
+            group_by=self.payload.get('group_by'),
+            allowed_aggregates=self.allowed_aggregates,
+            allowed_group_by=self.allowed_group_by
+        )
+        if aggregation.empty:
+            return {}
+        rows = await self.bind.all(aggregation.aggregate(self.query))
+        return aggregation.result(rows)
+
+    @actor(serializer_class=None, deserializer_class=None, priority=READ_PRIORITY, read_only=True)
+    async def aggregate(self):
+        """
+        payload: {"aggregates": {"funds": ["sum", "avg"]}, "group_by": ["orders"]}
+        """
+        return await self.perform_aggregate()
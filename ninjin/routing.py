@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+from ninjin.logger import logger
+
+# requests sharing the key read their own writes
+CONSISTENCY_KEY_HEADER = 'x-consistency-key'
+# set by the caller on reads which have to see its recent writes
+READ_PRIMARY_HEADER = 'x-read-primary'
+# handlers of `ModelResource` which don't write
+READ_ONLY_HANDLERS = frozenset(('get', 'get_list', 'count', 'aggregate'))
+
+
+class RecentWrites:
+    """
+    Writes a caller published per consistency key. The caller tracks them because
+    a read usually lands on another consumer process than the write before it
+    """
+    def __init__(self, window: float, clock=time.monotonic):
+        """
+        :param window: seconds after a write when reads with its key go to the primary
+        :param clock:
+        """
+        self.window = window
+        self.clock = clock
+        self.written = {}
+
+    def write(self, consistency_key):
+        now = self.clock()
+        self.written[consistency_key] = now
+        if len(self.written) > 10000:
+            self.written = {key: at for key, at in self.written.items() if now - at < self.window}
+
+    def pinned(self, consistency_key) -> bool:
+        """
+        :return: True while reads with the key have to go to the primary
+        """
+        written = self.written.get(consistency_key)
+        return written is not None and self.clock() - written < self.window
+
+
+class ReplicaRouter:
+    """
+    Sends read-only handlers to healthy replicas (round-robin) and everything
+    else to the primary. Reads the caller marked with `x-read-primary`
+    go to the primary as well, see `RecentWrites`
+    """
+    def __init__(self,
+                 primary,
+                 replicas=(),
+                 health_check_interval: float = 5,
+                 health_check_timeout: float = 1):
+        """
+        :param primary: `gino.Gino` instance or engine
+        :param replicas: engines, e.g. from `gino.create_engine`
+        :param health_check_interval: seconds
+        :param health_check_timeout: seconds
+        """
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.healthy = [True] * len(self.replicas)
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self.routed = {'primary': 0, 'replica': 0}
+        self._next = 0
+        self._health_checks = None
+
+    def route(self, read_only: bool, read_primary: bool = False):
+        if not read_only or read_primary:
+            return self._primary()
+
+        healthy = [replica for replica, ok in zip(self.replicas, self.healthy) if ok]
+        if not healthy:
+            return self._primary()
+        self._next = (self._next + 1) % len(healthy)
+        self.routed['replica'] += 1
+        return healthy[self._next]
+
+    def _primary(self):
+        self.routed['primary'] += 1
+        return self.primary
+
+    def mark_unhealthy(self, replica, reason=None):
+        index = self.replicas.index(replica)
+        if self.healthy[index]:
+            logger.warning('Replica #{} is unhealthy: {!r}'.format(index, reason))
+        self.healthy[index] = False
+
+    async def check(self):
+        for index, replica in enumerate(self.replicas):
+            try:
+                await asyncio.wait_for(replica.scalar('SELECT 1'), self.health_check_timeout)
+            except Exception as e:
+                self.mark_unhealthy(replica, e)
+            else:
+                if not self.healthy[index]:
+                    logger.info('Replica #{} is healthy again'.format(index))
+                self.healthy[index] = True
+
+    async def _check_forever(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.health_check_interval)
+
+    def start(self):
+        if self.replicas and self._health_checks is None:
+            self._health_checks = asyncio.ensure_future(self._check_forever())
+
+    async def close(self):
+        if self._health_checks is not None:
+            self._health_checks.cancel()
+            self._health_checks = None
+        await asyncio.gather(*[replica.close() for replica in self.replicas])
+
+    def stats(self) -> dict:
+        return {
+            'routed': dict(self.routed),
+            'healthy_replicas': sum(self.healthy),
+            'replicas': len(self.replicas),
+        }
@@ -0,0 +1,117 @@
+"""
+Event loop runtime: uvloop when it is installed and a lag monitor which
+names the handler blocking the loop.
+"""
+import asyncio
+import threading
+import time
+from collections import Counter
+
+from ninjin.logger import logger
+from ninjin.metrics import Timings
+
+
+def install_uvloop() -> bool:
+    """
+    Makes uvloop the event loop policy, must be called before the loop is created
+    :return: False if uvloop is not installed
+    """
+    try:
+        import uvloop
+    except ImportError:
+        logger.info('uvloop is not installed, using the default event loop')
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
+
+
+def current_task(loop=None):
+    """
+    `asyncio.current_task` of python 3.7+, `asyncio.Task.current_task` before
+    """
+    if hasattr(asyncio, 'current_task'):
+        return asyncio.current_task(loop)
+    return asyncio.Task.current_task(loop=loop)
+
+
+def task_name(task) -> str:
+    coro = task.get_coro() if hasattr(task, 'get_coro') else getattr(task, '_coro', None)
+    return getattr(coro, '__qualname__', repr(task))
+
+
+def run(main, use_uvloop: bool = True):
+    """
+    Runs the coroutine until it is complete, on uvloop if it is available
+    :param main: coroutine
+    :param use_uvloop:
+    :return: result of the coroutine
+    """
+    if use_uvloop:
+        install_uvloop()
+    return asyncio.get_event_loop().run_until_complete(main)
+
+
+class LagMonitor:
+    """
+    A heartbeat coroutine measures how late the loop wakes it up. A watchdog
+    thread notices a heartbeat which is late for longer than `threshold`
+    while the loop is still blocked and logs the task running at that moment
+    """
+    def __init__(self, interval: float = 0.05, threshold: float = 0.1, describe=None):
+        """
+        :param interval: seconds between heartbeats
+        :param threshold: seconds, longer blocks are logged
+        :param describe: callable returning a name of the running task
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.describe = describe or task_name
+        self.lags = Timings(max_samples=10000)
+        self.blocked = Counter()
+        self.loop = None
+        self.heartbeat = None
+        self._sampler = None
+        self._watchdog = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        if self._sampler is not None:
+            return
+        self.loop = asyncio.get_event_loop()
+        self.heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._sampler = asyncio.ensure_future(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, name='ninjin-lag-monitor', daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.cancel()
+            self._sampler = None
+
+    async def _sample(self):
+        while True:
+            started = self.loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.observe(max(self.loop.time() - started - self.interval, 0))
+            self.heartbeat = time.monotonic()
+
+    def _watch(self):
+        reported = None
+        while not self._stopped.wait(self.interval):
+            heartbeat = self.heartbeat
+            blocked_for = time.monotonic() - heartbeat - self.interval
+            if blocked_for < self.threshold or reported == heartbeat:
+                continue
+            reported = heartbeat
+            task = current_task(self.loop)
+            name = self.describe(task) if task is not None else 'a callback'
+            self.blocked[name] += 1
+            logger.warning('Event loop has been blocked for {:.3f}s by {}'.format(blocked_for, name))
+
+    def stats(self) -> dict:
+        return {
+            'lag': self.lags.summary(),
+            'blocked': dict(self.blocked),
+        }
@@ -1,3 +1,4 @@
+import functools
 import typing
 
 import simplejson as simplejson
@@ -13,6 +14,21 @@ class PaginationSchema(Schema):
     size = fields.Integer(required=False, default=100)
 
 
+class BatchItemSchema(Schema):
+    resource = fields.String(required=False, allow_none=True)
+    handler = fields.String(required=True)
+    payload = fields.Raw(required=False)
+
+    filtering = fields.Raw(required=False)
+    ordering = fields.String(required=False)
+    pagination = fields.Raw(required=False, allow_none=True)
+    # sparse field selection, `fields` in messages
+    fields_ = fields.List(fields.String(), data_key='fields', attribute='fields', required=False, allow_none=True)
+
+    class Meta:
+        unknown = EXCLUDE
+
+
 class PayloadSchema(Schema):
     resource = fields.String(required=False, allow_none=True)
     handler = fields.String(required=True)
@@ -21,12 +37,17 @@ class PayloadSchema(Schema):
     filtering = fields.Raw(required=False)
     ordering = fields.String(required=False)
     pagination = fields.Raw(required=False, allow_none=True)
+    # sparse field selection, `fields` in messages
+    fields_ = fields.List(fields.String(), data_key='fields', attribute='fields', required=False, allow_none=True)
 
     # scheduler only fields
     forward = fields.String(required=False, allow_none=True)
     period = fields.Integer(required=False, allow_none=True)
     repeat = fields.Boolean(required=False, allow_none=True)
 
+    # sub-requests of a batch, see `Pool.batch`
+    batch = fields.List(fields.Nested(BatchItemSchema), required=False, allow_none=True)
+
     class Meta:
         unknown = EXCLUDE
         json_module = simplejson
@@ -43,6 +64,14 @@ class PayloadSchema(Schema):
             *args, **kwargs).encode('utf-8')
 
 
+@functools.lru_cache(maxsize=256)
+def schema_instance(schema_class, many: bool = False, only: typing.Tuple[str] = None) -> Schema:
+    """
+    Schemas are stateless while dumping, so one instance per field set is enough
+    """
+    return schema_class(many=many, only=only)
+
+
 class IdSchema(Schema):
     id = fields.UUID(required=False)
 
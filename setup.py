@@ -15,9 +15,17 @@ setup(
     name='ninjin',
     version=__version__,
     keywords="ninjin",
-    packages=find_packages(exclude=['tests']),
+    packages=find_packages(exclude=['tests', 'benchmarks']),
     install_requires=requirements,
+    entry_points={
+        'console_scripts': [
+            'ninjin-bench=ninjin.loadgen:main',
+        ]
+    },
     extras_require={
+        'uvloop': [
+            'uvloop',
+        ],
         'dev': [
             'mock',
             'async-generator==1.10',
@@ -41,6 +49,7 @@ setup(
             'pytest-pep8',
             'pytest-mock==3.1.0',
             'pytest-asyncio==0.11.0',
+            'pytest-benchmark',
         ]
     },
     classifiers=[
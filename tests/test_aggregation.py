@@ -0,0 +1,110 @@
+import datetime
+import uuid
+
+import pytest
+from marshmallow import (
+    Schema,
+    fields
+)
+from sqlalchemy.dialects import postgresql
+
+from ninjin.aggregation import (
+    AVG,
+    SUM,
+    BasicAggregation
+)
+from ninjin.resource import ModelResource
+from tests.models import User
+
+dialect = postgresql.dialect()
+
+
+class UserSchema(Schema):
+    id = fields.UUID()
+    nickname = fields.String()
+    age = fields.Integer()
+
+
+class AdultResource(ModelResource):
+    model = User
+    serializer_class = UserSchema
+    allowed_fields = ('nickname', 'age')
+    allowed_aggregates = {'age': (SUM, AVG)}
+    allowed_group_by = ('date_created',)
+
+    def select(self):
+        return super().select().where(User.age >= 18)
+
+
+def compiled(query):
+    return str(query.compile(dialect=dialect))
+
+
+def aggregation(group_by=('date_created',)):
+    return BasicAggregation(
+        User,
+        aggregates={'age': ['sum', 'max'], 'nickname': 'sum'},
+        group_by=group_by,
+        allowed_aggregates=AdultResource.allowed_aggregates,
+        allowed_group_by=AdultResource.allowed_group_by
+    )
+
+
+def test_only_allowed_aggregates_are_applied():
+    assert aggregation().applicable_aggregates == [('age', SUM)]
+    assert aggregation(group_by=('nickname',)).applicable_group_by == []
+
+
+def test_aggregates_the_resource_query():
+    resource = AdultResource(dict(handler='aggregate', filtering={'id': str(uuid.uuid4())}), message=None)
+    sql = compiled(aggregation().aggregate(resource.query))
+    assert 'sum(aggregated.age) AS age__sum' in sql
+    assert 'users.age >= ' in sql
+    assert 'users.id = ' in sql
+    assert 'GROUP BY aggregated.date_created' in sql
+
+
+def test_aggregates_ignore_selected_fields():
+    resource = AdultResource(dict(handler='aggregate', fields=['nickname']), message=None)
+    assert resource.selected_fields is None
+    assert 'sum(aggregated.age) AS age__sum' in compiled(aggregation().aggregate(resource.query))
+
+
+class Connection:
+    def __init__(self, result):
+        self.result = result
+        self.queries = []
+
+    async def scalar(self, query):
+        self.queries.append(query)
+        return self.result
+
+
+@pytest.mark.asyncio
+async def test_count_uses_the_resource_query():
+    resource = AdultResource(dict(handler='count'), message=None)
+    resource.connection = Connection(42)
+    assert await resource.perform_count() == 42
+    assert 'users.age >= ' in compiled(resource.connection.queries[0])
+
+
+def test_group_by_values_are_json_friendly():
+    ident = uuid.uuid4()
+    rows = [
+        {'date_created': datetime.datetime(2020, 1, 1, 12), 'age__sum': 30},
+        {'date_created': datetime.date(2020, 1, 2), 'age__sum': ident},
+    ]
+    assert aggregation().result(rows) == [
+        {'date_created': '2020-01-01T12:00:00', 'age__sum': 30},
+        {'date_created': '2020-01-02', 'age__sum': str(ident)},
+    ]
+    assert aggregation(group_by=()).result([{'age__sum': 1}]) == {'age__sum': 1}
+    assert aggregation(group_by=()).result([]) == {}
+
+
+@pytest.mark.asyncio
+async def test_count_ignores_selected_fields():
+    resource = AdultResource(dict(handler='count', fields=['nickname']), message=None)
+    resource.connection = Connection(42)
+    assert await resource.perform_count() == 42
+    assert 'users.date_created' in compiled(resource.connection.queries[0])
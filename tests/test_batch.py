@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from ninjin.batch import (
+    ERROR,
+    OK
+)
+from ninjin.decorator import actor
+from ninjin.loopback import LoopbackBroker
+from ninjin.pool import Pool
+from ninjin.resource import Resource
+
+
+class CartResource(Resource):
+    running = 0
+    max_running = 0
+
+    @actor()
+    async def get(self):
+        CartResource.running += 1
+        CartResource.max_running = max(CartResource.max_running, CartResource.running)
+        # the longer the wait, the later the item finishes
+        await asyncio.sleep(self.payload.get('delay', 0))
+        CartResource.running -= 1
+        return {'id': self.payload['id']}
+
+    @actor()
+    async def fail(self):
+        raise ValueError('cart is empty')
+
+    @actor(never_reply=True)
+    async def touch(self):
+        return {'touched': True}
+
+
+async def make_pools(**kwargs):
+    broker = LoopbackBroker()
+    server = Pool('service', exchange_name='ninjin', connection_factory=broker.connect, **kwargs)
+    client = Pool('client', exchange_name='ninjin', connection_factory=broker.connect)
+    for pool in (server, client):
+        await pool.connect()
+    await server.register(CartResource)
+    await server.start()
+    await client.start()
+    CartResource.running = CartResource.max_running = 0
+    return server, client
+
+
+async def close(*pools):
+    for pool in pools:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_item_statuses():
+    server, client = await make_pools()
+    results = await client.batch([
+        {'resource': 'cart', 'handler': 'get', 'payload': {'id': 1}},
+        {'resource': 'order', 'handler': 'get', 'payload': {'id': 1}},
+        {'resource': 'cart', 'handler': 'unknown'},
+        {'resource': 'cart', 'handler': 'fail'},
+        {'resource': 'cart', 'handler': 'touch'},
+    ], service_name='service', timeout=1)
+    assert [result['status'] for result in results] == [OK, ERROR, ERROR, ERROR, OK]
+    assert results[0]['payload'] == {'id': 1}
+    assert results[1]['error'].startswith('UnknownConsumer: ')
+    assert 'order' in results[1]['error']
+    assert 'unknown' in results[2]['error']
+    assert results[3]['error'] == 'ValueError: cart is empty'
+    assert results[4]['payload'] is None
+    assert server.stats()['messages']['batch_items'] == 5
+    await close(server, client)
+
+
+@pytest.mark.asyncio
+async def test_items_respect_concurrency_and_keep_order():
+    server, client = await make_pools(concurrency=2)
+    delays = [0.03, 0.01, 0.02, 0, 0.01, 0]
+    results = await client.batch([
+        {'resource': 'cart', 'handler': 'get', 'payload': {'id': ident, 'delay': delay}}
+        for ident, delay in enumerate(delays)
+    ], service_name='service', timeout=1)
+    assert [result['payload'] for result in results] == [{'id': ident} for ident in range(len(delays))]
+    assert CartResource.max_running == 2
+    await close(server, client)
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from ninjin.cache import (
+    FRESH,
+    STALE,
+    ResponseCache
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_fresh_then_stale_then_expired(clock):
+    cache = ResponseCache(ttl=10, stale_ttl=5, clock=clock)
+    cache.set('key', {'id': 1})
+    assert cache.get('key') == ({'id': 1}, FRESH)
+    clock.now = 12
+    assert cache.get('key') == ({'id': 1}, STALE)
+    clock.now = 16
+    assert cache.get('key') == (None, None)
+    assert 'key' not in cache.entries
+
+
+def test_per_resource_ttl(clock):
+    cache = ResponseCache(ttl=10, ttls={'customer': 1}, clock=clock)
+    assert cache.enabled_for('customer')
+    assert not cache.enabled_for('order')
+    assert cache.enabled_for('order', cache=True)
+    assert not cache.enabled_for('customer', cache=False)
+    cache.set('key', 'reply')
+    clock.now = 2
+    assert cache.get('key', 'customer') == (None, None)
+
+
+def test_lru_eviction(clock):
+    cache = ResponseCache(max_size=2, clock=clock)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert list(cache.entries) == ['a', 'c']
+    assert cache.evictions == 1
+
+
+def test_hit_ratio(clock):
+    cache = ResponseCache(ttl=10, stale_ttl=10, clock=clock)
+    assert cache.hit_ratio is None
+    cache.get('key')
+    cache.set('key', 1)
+    cache.get('key')
+    clock.now = 15
+    cache.get('key')
+    cache.get('other')
+    assert cache.hit_ratio == 0.5
+    assert cache.stats()['stale_hits'] == 1
+
+
+def test_invalidate(clock):
+    cache = ResponseCache(clock=clock)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.invalidate('a')
+    assert list(cache.entries) == ['b']
+    cache.invalidate()
+    assert not cache.entries
+
+
+@pytest.mark.asyncio
+async def test_fetch_coalesces_misses(clock):
+    cache = ResponseCache(clock=clock)
+    calls = []
+
+    async def fetcher():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 'reply'
+
+    assert await asyncio.gather(*[cache.fetch('key', fetcher) for _ in range(3)]) == ['reply'] * 3
+    assert len(calls) == 1
+    assert cache.get('key') == ('reply', FRESH)
+
+
+@pytest.mark.asyncio
+async def test_revalidate_refreshes_in_background(clock):
+    cache = ResponseCache(ttl=1, stale_ttl=10, clock=clock)
+    cache.set('key', 'old')
+    clock.now = 2
+
+    async def fetcher():
+        return 'new'
+
+    cache.revalidate('key', fetcher)
+    await asyncio.sleep(0.01)
+    assert cache.get('key') == ('new', FRESH)
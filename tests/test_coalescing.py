@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from ninjin.coalescing import (
+    SingleFlight,
+    make_key
+)
+
+
+def test_make_key_is_order_independent():
+    assert make_key('user', {'a': 1, 'b': 2}) == make_key('user', {'b': 2, 'a': 1})
+    assert make_key('user', {'a': 1}) != make_key('user', {'a': 2})
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_result():
+    single_flight = SingleFlight()
+    calls = []
+
+    async def func():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {'id': 1}
+
+    results = await asyncio.gather(*[single_flight.do('key', func) for _ in range(5)])
+    assert results == [{'id': 1}] * 5
+    assert len(calls) == 1
+    assert single_flight.executed == 1
+    assert single_flight.coalesced == 4
+    assert single_flight.calls == {}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_exception():
+    single_flight = SingleFlight()
+
+    async def func():
+        await asyncio.sleep(0.01)
+        raise ValueError('boom')
+
+    results = await asyncio.gather(*[single_flight.do('key', func) for _ in range(3)], return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert single_flight.executed == 1
+    assert single_flight.calls == {}
+
+
+@pytest.mark.asyncio
+async def test_sequential_calls_are_not_coalesced():
+    single_flight = SingleFlight()
+
+    async def func():
+        return 1
+
+    await single_flight.do('key', func)
+    await single_flight.do('key', func)
+    assert single_flight.executed == 2
+    assert single_flight.coalesced == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_others():
+    single_flight = SingleFlight()
+
+    async def func():
+        await asyncio.sleep(0.02)
+        return 'done'
+
+    first = asyncio.ensure_future(single_flight.do('key', func))
+    second = asyncio.ensure_future(single_flight.do('key', func))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == 'done'
@@ -0,0 +1,174 @@
+import asyncio
+
+import pytest
+
+from ninjin.control import (
+    ERRORS,
+    INCREASE,
+    LATENCY,
+    AdaptiveLimit
+)
+from ninjin.decorator import actor
+from ninjin.loopback import LoopbackBroker
+from ninjin.pool import Pool
+from ninjin.resource import Resource
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+async def window(limit, clock, latency=0.01, failed=False, calls=None):
+    """
+    Fills the limit, then completes every call after the interval is over
+    """
+    calls = calls or limit.limit
+    for _ in range(calls):
+        await limit.acquire()
+    clock.now += limit.interval
+    for _ in range(calls):
+        limit.release(latency, failed)
+
+
+@pytest.mark.asyncio
+async def test_increases_when_saturated_and_healthy(clock):
+    limit = AdaptiveLimit(initial=2, max_limit=10, target_latency=0.1, clock=clock)
+    await window(limit, clock)
+    assert limit.limit == 3
+    assert limit.decisions == {INCREASE: 1}
+
+
+@pytest.mark.asyncio
+async def test_does_not_increase_when_not_saturated(clock):
+    limit = AdaptiveLimit(initial=4, target_latency=0.1, clock=clock)
+    await window(limit, clock, calls=1)
+    assert limit.limit == 4
+
+
+@pytest.mark.asyncio
+async def test_decreases_on_latency(clock):
+    changes = []
+    limit = AdaptiveLimit(initial=10, target_latency=0.1, decrease=0.5, clock=clock, on_change=changes.append)
+    await window(limit, clock, latency=0.2)
+    assert limit.limit == 5
+    assert changes == [5]
+    assert limit.decisions == {LATENCY: 1}
+    assert limit.history[-1]['previous'] == 10
+
+
+@pytest.mark.asyncio
+async def test_decreases_on_errors(clock):
+    limit = AdaptiveLimit(initial=10, max_error_rate=0.05, decrease=0.5, clock=clock)
+    await window(limit, clock, failed=True)
+    assert limit.limit == 5
+    assert limit.decisions == {ERRORS: 1}
+
+
+@pytest.mark.asyncio
+async def test_bounds(clock):
+    limit = AdaptiveLimit(initial=2, min_limit=2, max_limit=3, target_latency=0.1, decrease=0.1, clock=clock)
+    await window(limit, clock, latency=1)
+    assert limit.limit == 2
+    await window(limit, clock)
+    await window(limit, clock)
+    assert limit.limit == 3
+    assert AdaptiveLimit(initial=100, max_limit=10).limit == 10
+
+
+@pytest.mark.asyncio
+async def test_waits_for_a_free_slot(clock):
+    limit = AdaptiveLimit(initial=1, clock=clock)
+    await limit.acquire()
+    waiter = asyncio.ensure_future(limit.acquire())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+    limit.release(0.01)
+    await asyncio.wait_for(waiter, 1)
+    assert limit.in_flight == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_passes_the_slot_on(clock):
+    limit = AdaptiveLimit(initial=1, clock=clock)
+    await limit.acquire()
+    first = asyncio.ensure_future(limit.acquire())
+    second = asyncio.ensure_future(limit.acquire())
+    await asyncio.sleep(0)
+    first.cancel()
+    limit.release(0.01)
+    await asyncio.wait_for(second, 1)
+    assert limit.in_flight == 1
+
+
+class JobResource(Resource):
+    started = []
+
+    @actor(never_reply=True)
+    async def run(self):
+        done = asyncio.get_event_loop().create_future()
+        self.started.append(done)
+        await done
+
+
+async def close(pool):
+    for done in JobResource.started:
+        if not done.done():
+            done.set_result(None)
+    await asyncio.sleep(0.01)
+    await pool.close()
+
+
+async def make_pool(**kwargs):
+    pool = Pool('service', exchange_name='ninjin', connection_factory=LoopbackBroker().connect, **kwargs)
+    await pool.connect()
+    await pool.register(JobResource)
+    await pool.start()
+    JobResource.started = []
+    for _ in range(6):
+        await pool.publish({}, 'service', 'job', 'run')
+    await asyncio.sleep(0.01)
+    return pool
+
+
+@pytest.mark.asyncio
+async def test_prefetch_follows_concurrency():
+    pool = await make_pool(concurrency=2)
+    queue = pool.queues.queues['service']
+    assert queue.prefetch_count == 2
+    assert (len(JobResource.started), len(queue.pending)) == (2, 4)
+    JobResource.started[0].set_result(None)
+    await asyncio.sleep(0.01)
+    assert (len(JobResource.started), len(queue.pending)) == (3, 3)
+    await close(pool)
+
+
+@pytest.mark.asyncio
+async def test_adaptive_limit_gates_prefetched_messages(clock):
+    pool = await make_pool(concurrency=2, target_latency=10, max_concurrency=6)
+    queue = pool.queues.queues['service']
+    limiter = pool.queues.limiter
+    limiter.clock = clock
+    limiter._window_started = clock()
+    # consumers keep the prefetch count they started with, the limit can't shrink it
+    assert queue.prefetch_count == 6
+    assert len(queue.pending) == 0
+    assert len(JobResource.started) == 2
+    assert limiter.stats()['waiting'] == 4
+
+    # the limit grows without restarting consumers
+    clock.now += limiter.interval
+    JobResource.started[0].set_result(None)
+    await asyncio.sleep(0.01)
+    assert limiter.limit == 3
+    assert len(JobResource.started) == 4
+    assert limiter.in_flight == 3
+    await close(pool)
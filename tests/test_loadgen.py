@@ -0,0 +1,73 @@
+import asyncio
+import json
+import random
+
+import pytest
+
+from ninjin.decorator import actor
+from ninjin.loadgen import (
+    PUBLISH,
+    RPC,
+    main
+)
+from ninjin.resource import Resource
+
+REQUESTS = 50
+
+
+class FailingResource(Resource):
+    @actor()
+    async def fail(self):
+        raise ValueError('boom')
+
+
+@pytest.fixture(autouse=True)
+def loop():
+    # `main` runs on the current event loop like a console script
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+def bench(capsys, *argv):
+    code = main([
+        '--loopback', '--no-uvloop', '--json', '--service', 'bench', '--requests', str(REQUESTS), *argv
+    ])
+    return code, json.loads(capsys.readouterr().out)
+
+
+def test_loopback_echo(capsys):
+    random.seed(1)
+    code, report = bench(
+        capsys,
+        '--register', 'benchmarks.models:EchoResource',
+        '--resource', 'echo',
+        '--handler', 'echo',
+        '--payload', '{"ping": "pong"}',
+        '--rpc-ratio', '0.5',
+        '--concurrency', '5',
+    )
+    assert code == 0
+    assert report['completed'] == REQUESTS
+    assert report['errors'] == {}
+    latency = report['latency']
+    assert latency[RPC]['count'] + latency[PUBLISH]['count'] == REQUESTS
+    assert latency[RPC]['count'] and latency[PUBLISH]['count']
+    for summary in latency.values():
+        assert {'p50', 'p95', 'p99', 'max'} <= set(summary)
+
+
+def test_errors_are_counted(capsys):
+    code, report = bench(
+        capsys,
+        '--register', 'tests.test_loadgen:FailingResource',
+        '--resource', 'failing',
+        '--handler', 'fail',
+        '--timeout', '0.05',
+        '--concurrency', '10',
+    )
+    assert code == 1
+    assert report['completed'] == 0
+    assert report['errors'] == {'rpc: TimeoutError': REQUESTS}
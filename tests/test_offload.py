@@ -0,0 +1,77 @@
+import pytest
+
+from ninjin.decorator import actor
+from ninjin.loopback import LoopbackBroker
+from ninjin.offload import (
+    PROCESS,
+    THREAD
+)
+from ninjin.pool import Pool
+from ninjin.resource import Resource
+
+ROWS = 3
+BYTES = 1024
+
+
+class ReportResource(Resource):
+    @actor()
+    async def rows(self):
+        return [{'row': row} for row in range(self.payload['rows'])]
+
+
+async def make_pools(executor=THREAD):
+    broker = LoopbackBroker()
+    server = Pool('service', exchange_name='ninjin', connection_factory=broker.connect,
+                  offload_rows=ROWS, offload_bytes=BYTES, offload_executor=executor, offload_workers=1)
+    client = Pool('client', exchange_name='ninjin', connection_factory=broker.connect)
+    for pool in (server, client):
+        await pool.connect()
+    await server.register(ReportResource)
+    await server.start()
+    await client.start()
+    return server, client
+
+
+async def close(*pools):
+    for pool in pools:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_small_replies_stay_on_the_loop():
+    server, client = await make_pools()
+    reply = await client.rpc({'rows': ROWS - 1}, 'service', 'report', 'rows')
+    assert reply['payload'] == [{'row': 0}, {'row': 1}]
+    assert not server.offloader.offloaded
+    assert 'offloaded' not in server.stats()
+    await close(server, client)
+
+
+@pytest.mark.asyncio
+async def test_large_replies_are_offloaded():
+    server, client = await make_pools()
+    reply = await client.rpc({'rows': ROWS}, 'service', 'report', 'rows')
+    assert reply['payload'] == [{'row': row} for row in range(ROWS)]
+    assert server.offloader.offloaded == {'serialize': 1, 'dumps': 1}
+    await close(server, client)
+
+
+@pytest.mark.asyncio
+async def test_large_bodies_are_offloaded():
+    server, client = await make_pools()
+    await client.rpc({'rows': 1, 'padding': 'x' * (BYTES // 2)}, 'service', 'report', 'rows')
+    assert 'loads' not in server.offloader.offloaded
+    reply = await client.rpc({'rows': 1, 'padding': 'x' * BYTES}, 'service', 'report', 'rows')
+    assert reply['payload'] == [{'row': 0}]
+    assert server.offloader.offloaded['loads'] == 1
+    await close(server, client)
+
+
+@pytest.mark.asyncio
+async def test_process_executor_round_trips_a_reply():
+    server, client = await make_pools(executor=PROCESS)
+    reply = await client.rpc({'rows': ROWS, 'padding': 'x' * BYTES}, 'service', 'report', 'rows')
+    assert reply['payload'] == [{'row': row} for row in range(ROWS)]
+    assert server.offloader.offloaded == {'serialize': 1, 'dumps': 1, 'loads': 1}
+    assert server.offloader._executor is not None
+    await close(server, client)
@@ -0,0 +1,33 @@
+from ninjin.pagination import BasicPagination
+
+
+class LegacyPagination(BasicPagination):
+    items_per_page = 20
+    max_items_per_page = 50
+
+
+def test_defaults():
+    pagination = BasicPagination()
+    assert (pagination.items_per_page, pagination.max_items_per_page) == (1, 100)
+    assert not hasattr(pagination, '__dict__')
+
+
+def test_resource_values_win():
+    pagination = LegacyPagination({'page': 2}, items_per_page=10, max_items_per_page=30)
+    assert (pagination.items_per_page, pagination.max_items_per_page) == (10, 30)
+    assert (pagination.limit, pagination.offset) == (30, 20)
+
+
+def test_subclass_overrides_are_honored():
+    pagination = LegacyPagination()
+    assert (pagination.items_per_page, pagination.max_items_per_page) == (20, 50)
+    assert LegacyPagination({'items_per_page': 80}).items_per_page == 50
+
+
+class WidePagination(LegacyPagination):
+    max_items_per_page = 500
+
+
+def test_overrides_are_inherited():
+    pagination = WidePagination()
+    assert (pagination.items_per_page, pagination.max_items_per_page) == (20, 500)
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from ninjin.decorator import actor
+from ninjin.loopback import LoopbackBroker
+from ninjin.pool import (
+    Pool,
+    partition
+)
+from ninjin.resource import Resource
+
+MESSAGES = 10
+
+
+def test_partition_is_stable():
+    # crc32, the same in every process whatever PYTHONHASHSEED is
+    assert [partition(key, 8) for key in ('user-1', 'user-2', 42)] == [4, 6, 0]
+
+
+def test_routing_key():
+    pool = Pool('service', partitions={'orders': 8}, partition_field='user')
+    assert pool.routing_key('orders', {'user': 'user-1'}) == 'orders.4'
+    assert pool.routing_key('orders', {'user': 'user-1'}, partition_key='user-2') == 'orders.6'
+    assert pool.routing_key('orders', {'id': 1}) in {'orders.{}'.format(index) for index in range(8)}
+    assert pool.routing_key('users', {'user': 'user-1'}) == 'users'
+
+
+class OrderResource(Resource):
+    handled = []
+
+    @actor(never_reply=True)
+    async def append(self):
+        # earlier messages take longer, concurrent handling would reorder them
+        await asyncio.sleep((MESSAGES - self.payload['n']) / 1000)
+        self.handled.append((self.payload['user'], self.payload['n']))
+
+
+class AuditResource(OrderResource):
+    pass
+
+
+async def make_pool():
+    pool = Pool('service', exchange_name='ninjin', partitions={'orders': 2}, partition_field='user',
+                connection_factory=LoopbackBroker().connect)
+    await pool.connect()
+    await pool.register(OrderResource, consumer_key='orders')
+    await pool.register(AuditResource, consumer_key='orders.audit')
+    await pool.start()
+    return pool
+
+
+@pytest.mark.asyncio
+async def test_partition_queues():
+    pool = await make_pool()
+    queues = pool.queues
+    assert queues.partition_queues == {'orders.0', 'orders.1'}
+    assert set(queues.queues) == {'orders.0', 'orders.1', 'orders.audit'}
+    assert queues.queues['orders.0'].arguments['x-single-active-consumer'] is True
+    assert 'x-single-active-consumer' not in queues.queues['orders.audit'].arguments
+    # a consumer key which only looks like a partition is consumed concurrently
+    assert queues.consumer('orders.audit') == queues._on_message
+    assert queues.consumer('orders.0') != queues._on_message
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_order_is_kept_per_key():
+    pool = await make_pool()
+    OrderResource.handled = []
+    users = ('user-1', 'user-2', 'user-3')
+    for n in range(MESSAGES):
+        for user in users:
+            await pool.publish({'user': user, 'n': n}, 'orders', 'order', 'append')
+    for _ in range(100):
+        if len(OrderResource.handled) == MESSAGES * len(users):
+            break
+        await asyncio.sleep(0.01)
+    for user in users:
+        assert [n for key, n in OrderResource.handled if key == user] == list(range(MESSAGES))
+    await pool.close()
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from ninjin.decorator import actor
+from ninjin.loopback import LoopbackBroker
+from ninjin.pool import Pool
+from ninjin.resource import Resource
+
+
+class TaskResource(Resource):
+    received = []
+
+    @actor(priority=7)
+    async def urgent(self):
+        self.received.append(self.message.priority)
+        return {}
+
+    @actor()
+    async def plain(self):
+        self.received.append(self.message.priority)
+        return {}
+
+
+async def make_pools():
+    broker = LoopbackBroker()
+    server = Pool('service', exchange_name='ninjin', max_priority=10, connection_factory=broker.connect)
+    client = Pool('client', exchange_name='ninjin', rpc_priority=3, connection_factory=broker.connect)
+    for pool in (server, client):
+        await pool.connect()
+    await server.register(TaskResource)
+    await server.start()
+    await client.start()
+    TaskResource.received = []
+    return server, client
+
+
+async def received(count):
+    for _ in range(100):
+        if len(TaskResource.received) >= count:
+            break
+        await asyncio.sleep(0.001)
+    return TaskResource.received
+
+
+@pytest.mark.asyncio
+async def test_queues_are_priority_queues():
+    server, client = await make_pools()
+    assert server.queues.queues['service'].arguments['x-max-priority'] == 10
+    assert 'x-max-priority' not in client.queues.queue_callback.arguments
+    await server.close()
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_publish_priority():
+    server, client = await make_pools()
+    await server.publish({}, 'service', 'task', 'urgent')
+    await server.publish({}, 'service', 'task', 'urgent', priority=2)
+    await server.publish({}, 'service', 'task', 'plain')
+    assert await received(3) == [7, 2, 0]
+    await server.close()
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_rpc_priority():
+    server, client = await make_pools()
+    # actors unknown to the caller get `rpc_priority`
+    await client.rpc({}, 'service', 'task', 'plain')
+    await client.rpc({}, 'service', 'task', 'plain', priority=1)
+    # the default of a known actor wins over `rpc_priority`
+    await server.rpc({}, 'service', 'task', 'urgent')
+    assert await received(3) == [3, 1, 7]
+    await server.close()
+    await client.close()
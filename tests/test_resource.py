@@ -0,0 +1,121 @@
+import uuid
+
+import pytest
+from marshmallow import (
+    Schema,
+    fields
+)
+
+from ninjin import envelope
+from ninjin.decorator import actor
+from ninjin.loopback import LoopbackBroker
+from ninjin.pool import Pool
+from ninjin.resource import (
+    ModelResource,
+    Resource
+)
+from tests.models import User
+
+
+class UserResource(ModelResource):
+    model = User
+    allowed_fields = ('nickname', 'age')
+
+
+class UserSchema(Schema):
+    id = fields.UUID()
+    nickname = fields.String()
+
+
+class NicknameResource(UserResource):
+    serializer_class = UserSchema
+
+
+def resource(resource_class, **data):
+    return resource_class(dict(handler='get_list', **data), message=None)
+
+
+def test_fields_missing_in_serializer_are_not_selected():
+    # the default serializer only declares `id`
+    users = resource(UserResource, fields=['nickname'])
+    assert users.selected_fields is None
+    row = {'id': uuid.uuid4(), 'nickname': 'john'}
+    assert users.serialize([row]) == [{'id': str(row['id'])}]
+
+
+def test_selected_fields_are_serialized():
+    users = resource(NicknameResource, fields=['nickname', 'age', 'unknown'])
+    assert users.selected_fields == ('id', 'nickname')
+    row = {'id': uuid.uuid4(), 'nickname': 'john', 'age': 30}
+    assert users.serialize(row) == {'id': str(row['id']), 'nickname': 'john'}
+
+
+def test_explicit_only_is_limited_to_serializer():
+    users = resource(NicknameResource)
+    row = {'id': uuid.uuid4(), 'nickname': 'john'}
+    assert users.serialize(row, only=('nickname', 'age')) == {'nickname': 'john'}
+
+
+class PingResource(Resource):
+    @actor()
+    async def ping(self):
+        return {'pong': True}
+
+    @actor()
+    async def echo(self):
+        return self.payload
+
+
+class Message:
+    correlation_id = '1'
+    priority = None
+    reply_to = 'caller'
+    headers = {}
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    bodies = []
+    original = envelope.loads
+
+    def loads(body):
+        bodies.append(body)
+        return original(body)
+    monkeypatch.setattr(envelope, 'loads', loads)
+    return bodies
+
+
+def received(resource_name, handler, **data):
+    return envelope.Envelope(
+        envelope.dumps(dict(resource=resource_name, handler=handler, **data)),
+        headers={envelope.RESOURCE_HEADER: resource_name, envelope.HANDLER_HEADER: handler}
+    )
+
+
+def test_model_resource_does_not_parse_body(parsed):
+    users = UserResource(received('user', 'get_list', ordering='-id'), message=None)
+    assert parsed == []
+    assert users.ordering.ordering
+    assert len(parsed) == 1
+
+
+@pytest.mark.asyncio
+async def test_handler_not_reading_body_does_not_parse_it(parsed):
+    pool = Pool('service', exchange_name='ninjin', connection_factory=LoopbackBroker().connect)
+    await pool.connect()
+    await pool.register(PingResource)
+    replies = []
+
+    async def publish(payload, **kwargs):
+        replies.append(payload)
+    pool.publish = publish
+    ping = pool.queues.resources['ping']
+
+    await pool.queues.dispatch(ping(received('ping', 'ping', payload={'ping': 1}), Message()))
+    assert replies == [{'pong': True}]
+    assert parsed == []
+
+    await pool.queues.dispatch(ping(received('ping', 'echo', payload={'ping': 1}), Message()))
+    assert replies[-1] == {'ping': 1}
+    assert len(parsed) == 1
+    await pool.close()
@@ -0,0 +1,307 @@
+import pytest
+
+from ninjin.database import Database
+from ninjin.decorator import actor
+from ninjin.loopback import LoopbackBroker
+from ninjin.pool import (
+    CONSISTENCY_KEY_HEADER,
+    Pool
+)
+from ninjin.resource import (
+    ModelResource,
+    Resource
+)
+from ninjin.routing import (
+    READ_PRIMARY_HEADER,
+    RecentWrites,
+    ReplicaRouter
+)
+from tests.models import (
+    PG_URL,
+    User,
+    db
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100
+
+    def __call__(self):
+        return self.now
+
+
+class Engine:
+    def __init__(self, name):
+        self.name = name
+        self.up = True
+        self.closed = False
+
+    def __repr__(self):
+        return self.name
+
+    async def scalar(self, query):
+        if not self.up:
+            raise ConnectionRefusedError(self.name)
+        return 1
+
+    async def acquire(self, reusable=False):
+        if not self.up:
+            raise ConnectionRefusedError(self.name)
+        return self
+
+    async def close(self):
+        self.closed = True
+
+    # the engine stands for its connections as well
+    def transaction(self):
+        return Transaction()
+
+    async def release(self):
+        pass
+
+
+class Transaction:
+    async def __aenter__(self):
+        pass
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+class Message:
+    correlation_id = '1'
+    priority = None
+
+    def __init__(self, headers=None, reply_to='caller'):
+        self.headers = headers or {}
+        self.reply_to = reply_to
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def engines():
+    return Engine('primary'), Engine('first'), Engine('second')
+
+
+@pytest.fixture
+def router(engines):
+    primary, *replicas = engines
+    return ReplicaRouter(primary, replicas)
+
+
+def test_writes_go_to_primary(router, engines):
+    assert router.route(read_only=False) is engines[0]
+
+
+def test_reads_are_spread_over_replicas(router, engines):
+    routed = [router.route(read_only=True) for _ in range(4)]
+    assert set(routed) == set(engines[1:])
+    assert routed[0] is routed[2] and routed[1] is routed[3]
+    assert router.stats()['routed'] == {'primary': 0, 'replica': 4}
+
+
+def test_unhealthy_replicas_are_skipped(router, engines):
+    primary, first, second = engines
+    router.mark_unhealthy(first)
+    assert {router.route(read_only=True) for _ in range(3)} == {second}
+    router.mark_unhealthy(second)
+    assert router.route(read_only=True) is primary
+    assert router.stats()['healthy_replicas'] == 0
+
+
+@pytest.mark.asyncio
+async def test_health_check(router, engines):
+    primary, first, second = engines
+    first.up = False
+    await router.check()
+    assert router.healthy == [False, True]
+    first.up = True
+    await router.check()
+    assert router.healthy == [True, True]
+    await router.close()
+    assert first.closed and second.closed and not primary.closed
+
+
+def test_reads_marked_by_the_caller_go_to_primary(router, engines):
+    assert router.route(read_only=True, read_primary=True) is engines[0]
+    assert router.route(read_only=True) is not engines[0]
+
+
+def test_recent_writes(clock):
+    writes = RecentWrites(2, clock=clock)
+    writes.write('user-1')
+    clock.now += 1
+    assert writes.pinned('user-1')
+    assert not writes.pinned('user-2')
+    clock.now += 1
+    assert not writes.pinned('user-1')
+
+
+class ProfileResource(Resource):
+    received = []
+
+    @actor()
+    async def update(self):
+        self.received.append(('update', self.message.headers.get(READ_PRIMARY_HEADER)))
+        return {}
+
+    @actor(read_only=True)
+    async def get(self):
+        self.received.append(('get', self.message.headers.get(READ_PRIMARY_HEADER)))
+        return {}
+
+
+@pytest.mark.asyncio
+async def test_caller_marks_reads_after_its_writes(clock):
+    broker = LoopbackBroker()
+    # the caller tracks its writes, consumers in other processes only see the header
+    server = Pool('service', exchange_name='ninjin', connection_factory=broker.connect)
+    client = Pool('client', exchange_name='ninjin', read_your_writes=2, connection_factory=broker.connect)
+    client.recent_writes.clock = clock
+    for pool in (server, client):
+        await pool.connect()
+    await server.register(ProfileResource)
+    await server.start()
+    await client.start()
+    ProfileResource.received = []
+
+    await client.rpc({}, 'service', 'profile', 'get', consistency_key='user-1')
+    await client.rpc({}, 'service', 'profile', 'update', consistency_key='user-1')
+    await client.rpc({}, 'service', 'profile', 'get', consistency_key='user-1')
+    await client.rpc({}, 'service', 'profile', 'get', consistency_key='user-2')
+    await client.rpc({}, 'service', 'profile', 'get')
+    clock.now += 2
+    await client.rpc({}, 'service', 'profile', 'get', consistency_key='user-1')
+    assert ProfileResource.received == [
+        ('get', None),
+        ('update', None),
+        ('get', 1),
+        ('get', None),
+        ('get', None),
+        ('get', None),
+    ]
+    await server.close()
+    await client.close()
+
+
+def test_model_resource_reads_are_known_without_registering():
+    pool = Pool('client', read_your_writes=2)
+    assert not pool.read_primary('user', 'get', 'user-1')
+    assert not pool.read_primary('user', 'update', 'user-1')
+    assert pool.read_primary('user', 'get', 'user-1')
+    assert pool.read_primary('user', 'get_list', 'user-1')
+    assert not pool.read_primary('user', 'get', 'user-2')
+    assert not Pool('client').read_primary('user', 'get', 'user-1')
+
+
+@pytest.mark.asyncio
+async def test_registered_actors_are_known():
+    pool = Pool('service', exchange_name='ninjin', read_your_writes=2, connection_factory=LoopbackBroker().connect)
+    await pool.connect()
+    await pool.register(ProfileResource)
+    assert pool.read_only_actors == {('profile', 'update'): False, ('profile', 'get'): True}
+    pool.read_primary('profile', 'update', 'user-1')
+    assert pool.read_primary('profile', 'get', 'user-1')
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_transaction_honours_read_primary(router, engines):
+    primary = engines[0]
+    pool = await make_pool(router)
+    database = Database(primary, router)
+
+    async def connection(headers=None):
+        resource = user_resource(pool, handler='get', headers=headers)
+
+        async def call():
+            return resource.connection
+        return await database.transaction(resource, call)
+    assert await connection({READ_PRIMARY_HEADER: 1}) is primary
+    assert await connection() is not primary
+    await pool.close()
+
+
+class UserResource(ModelResource):
+    model = User
+    coalesce_reads = True
+
+
+async def make_pool(router=None):
+    pool = Pool('service', exchange_name='ninjin', connection_factory=LoopbackBroker().connect)
+    await pool.connect()
+    await pool.register(UserResource)
+    pool.router = router
+    return pool
+
+
+def user_resource(pool, handler='count', headers=None):
+    return pool.queues.resources['user']({'handler': handler, 'payload': {}}, Message(headers))
+
+
+@pytest.mark.asyncio
+async def test_failed_replica_falls_back_to_primary(router, engines):
+    primary, first, second = engines
+    database = Database(primary, router)
+    first.up = False
+    acquired = {await database.acquire(read_only=True) for _ in range(3)}
+    assert acquired == {primary, second}
+    assert router.healthy == [False, True]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_key_includes_consistency_key(router):
+    pool = await make_pool(router)
+    keys = {
+        user_resource(pool).coalesce_key('count'),
+        user_resource(pool, headers={CONSISTENCY_KEY_HEADER: 'user-1'}).coalesce_key('count'),
+        user_resource(pool, headers={CONSISTENCY_KEY_HEADER: 'user-2'}).coalesce_key('count'),
+    }
+    assert len(keys) == 3 and None not in keys
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_reads_after_a_write_are_not_coalesced(router):
+    pool = await make_pool(router)
+    headers = {CONSISTENCY_KEY_HEADER: 'user-1', READ_PRIMARY_HEADER: 1}
+    assert user_resource(pool, headers=headers).coalesce_key('count') is None
+    assert user_resource(pool, headers={CONSISTENCY_KEY_HEADER: 'user-1'}).coalesce_key('count') is not None
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_postgres_replica():
+    pool = await make_pool()
+    try:
+        await pool.bind_db(db, PG_URL, replicas=[PG_URL], min_size=1, max_size=2)
+    except OSError as e:
+        await pool.close()
+        pytest.skip('Postgres is not available: {}'.format(e))
+    replies = []
+
+    async def publish(payload, **kwargs):
+        replies.append(payload)
+    pool.publish = publish
+    await db.gino.create_all()
+    try:
+        await pool.queues.dispatch(user_resource(pool))
+        assert replies == [{'count': 0}]
+        assert pool.router.stats()['routed'] == {'primary': 0, 'replica': 1}
+
+        pool.router.mark_unhealthy(pool.router.replicas[0])
+        await pool.queues.dispatch(user_resource(pool))
+        assert replies[-1] == {'count': 0}
+        assert pool.router.stats()['routed'] == {'primary': 1, 'replica': 1}
+
+        await pool.router.check()
+        assert pool.router.healthy == [True]
+    finally:
+        await db.gino.drop_all()
+        await pool.close()
+        await db.pop_bind().close()
@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+import pytest
+
+from ninjin.decorator import actor
+from ninjin.loopback import LoopbackBroker
+from ninjin.pool import Pool
+from ninjin.resource import Resource
+from ninjin.runtime import LagMonitor
+
+
+class ExportResource(Resource):
+    @actor()
+    async def build(self):
+        # a synchronous call the lag monitor should catch
+        time.sleep(0.3)
+        return {}
+
+
+async def make_pool():
+    pool = Pool('service', exchange_name='ninjin', connection_factory=LoopbackBroker().connect,
+                loop_lag_threshold=0.05, loop_lag_interval=0.01)
+    await pool.connect()
+    await pool.register(ExportResource)
+    await pool.start()
+    return pool
+
+
+@pytest.mark.asyncio
+async def test_blocking_handler_is_named():
+    pool = await make_pool()
+    # the heartbeat is fresh before the block starts
+    await asyncio.sleep(0.05)
+    await pool.rpc({}, 'service', 'export', 'build')
+    await asyncio.sleep(0.05)
+    stats = pool.stats()['loop']
+    assert stats['blocked'].get('export.build', 0) >= 1
+    assert stats['lag']['count'] > 0
+    assert pool.lag_monitor.lags.summary()['max'] >= 0.05
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_stop_ends_the_watchdog():
+    monitor = LagMonitor(interval=0.01, threshold=0.05)
+    monitor.start()
+    watchdog = monitor._watchdog
+    assert watchdog.is_alive()
+    await asyncio.sleep(0.03)
+    monitor.stop()
+    watchdog.join(timeout=1)
+    assert not watchdog.is_alive()
+    assert monitor._sampler is None
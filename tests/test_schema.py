@@ -0,0 +1,17 @@
+import json
+
+from ninjin.schema import PayloadSchema
+
+
+def test_fields_are_loaded_under_their_message_key():
+    data = PayloadSchema().loads(
+        b'{"handler": "get_list", "fields": ["nickname"], "batch": [{"handler": "get", "fields": ["age"]}]}'
+    )
+    assert data['fields'] == ['nickname']
+    assert data['batch'][0]['fields'] == ['age']
+    assert 'fields_' not in data
+
+
+def test_fields_are_dumped_under_their_message_key():
+    dumped = PayloadSchema().dumps({'handler': 'get_list', 'fields': ['nickname']})
+    assert json.loads(dumped) == {'handler': 'get_list', 'fields': ['nickname']}
@@ -0,0 +1,53 @@
+import pytest
+
+from ninjin import pool as pool_module
+from ninjin.pool import (
+    DEADLINE_HEADER,
+    EXPIRED,
+    PUBLISHED_AT_HEADER,
+    SHED,
+    Pool,
+    QueuePool
+)
+
+NOW = 1600000000000
+
+
+class Message:
+    def __init__(self, headers=None):
+        self.headers = headers
+
+
+@pytest.fixture(autouse=True)
+def now(monkeypatch):
+    monkeypatch.setattr(pool_module, 'now_ms', lambda: NOW)
+
+
+def queue_pool(**kwargs):
+    return QueuePool(pool=Pool('service', **kwargs), exchange_name=None)
+
+
+def test_no_headers():
+    assert queue_pool(max_queue_age=1).shed_reason(Message()) is None
+
+
+def test_expired():
+    queues = queue_pool()
+    assert queues.shed_reason(Message({DEADLINE_HEADER: NOW - 1})) == EXPIRED
+    assert queues.shed_reason(Message({DEADLINE_HEADER: NOW + 1})) is None
+
+
+def test_too_old():
+    queues = queue_pool(max_queue_age=30)
+    assert queues.shed_reason(Message({PUBLISHED_AT_HEADER: NOW - 31000})) == SHED
+    assert queues.shed_reason(Message({PUBLISHED_AT_HEADER: NOW - 29000})) is None
+
+
+def test_age_is_ignored_without_max_queue_age():
+    assert queue_pool().shed_reason(Message({PUBLISHED_AT_HEADER: NOW - 10 ** 9})) is None
+
+
+def test_expired_wins_over_too_old():
+    queues = queue_pool(max_queue_age=30)
+    message = Message({DEADLINE_HEADER: NOW - 1, PUBLISHED_AT_HEADER: NOW - 31000})
+    assert queues.shed_reason(message) == EXPIRED
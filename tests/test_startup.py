@@ -0,0 +1,82 @@
+import asyncio
+import inspect
+
+import pytest
+
+from ninjin import pool as pool_module
+from ninjin.decorator import actor
+from ninjin.loopback import LoopbackBroker
+from ninjin.pool import Pool
+from ninjin.resource import Resource
+
+FAILURES = 6
+
+
+class FlakyBroker(LoopbackBroker):
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+        self.attempts = []
+
+    async def connect(self, **kwargs):
+        # the depth stays the same when retries loop instead of recursing
+        self.attempts.append(len(inspect.stack()))
+        if len(self.attempts) <= self.failures:
+            raise ConnectionRefusedError('broker is starting')
+        return await super().connect(**kwargs)
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    delays = []
+
+    async def sleep(delay, *args, **kwargs):
+        delays.append(delay)
+    monkeypatch.setattr(asyncio, 'sleep', sleep)
+    # the longest delay full jitter allows
+    monkeypatch.setattr(pool_module.random, 'uniform', lambda low, high: high)
+    return delays
+
+
+class OrderResource(Resource):
+    @actor()
+    async def get(self):
+        return {}
+
+
+class InvoiceResource(OrderResource):
+    pass
+
+
+@pytest.mark.asyncio
+async def test_connect_retries_with_capped_backoff(delays):
+    broker = FlakyBroker(FAILURES)
+    pool = Pool('service', exchange_name='ninjin', connection_factory=broker.connect,
+                reconnect_delay=1, reconnect_max_delay=8)
+    await pool.connect()
+    assert delays == [1, 2, 4, 8, 8, 8]
+    assert len(broker.attempts) == FAILURES + 1
+    assert len(set(broker.attempts)) == 1
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_startup_timings():
+    pool = Pool('service', exchange_name='ninjin', connection_factory=LoopbackBroker().connect)
+    await pool.connect()
+    await pool.register_many([OrderResource, InvoiceResource])
+    await pool.start()
+    assert set(pool.stats()['startup']) == {'connect', 'declare', 'register', 'consume'}
+    assert all(duration >= 0 for duration in pool.startup_timings.values())
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_shared_consumer_key_is_declared_once():
+    pool = Pool('service', exchange_name='ninjin', connection_factory=LoopbackBroker().connect)
+    await pool.connect()
+    await pool.register_many([OrderResource, InvoiceResource], consumer_key='billing')
+    assert pool.queues.declared_queues == 1
+    assert (pool.queues.declarations.executed, pool.queues.declarations.coalesced) == (1, 1)
+    assert set(pool.queues.resources) == {'order', 'invoice'}
+    await pool.close()
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from ninjin.database import Database
+from ninjin.decorator import actor
+from ninjin.loopback import LoopbackBroker
+from ninjin.pool import Pool
+from ninjin.resource import Resource
+
+
+class Transaction:
+    def __init__(self, events):
+        self.events = events
+
+    async def __aenter__(self):
+        self.events.append('begin')
+
+    async def __aexit__(self, *exc_info):
+        self.events.append('commit' if exc_info[0] is None else 'rollback')
+
+
+class Connection:
+    def __init__(self, db):
+        self.db = db
+
+    def transaction(self):
+        return Transaction(self.db.events)
+
+    async def release(self):
+        self.db.events.append('release')
+
+
+class Engine:
+    def __init__(self):
+        self.events = []
+        self.acquired = 0
+
+    async def acquire(self, reusable=False):
+        self.acquired += 1
+        self.events.append('acquire')
+        return Connection(self)
+
+
+class Message:
+    headers = {}
+    correlation_id = '1'
+    priority = None
+
+    def __init__(self, reply_to='caller'):
+        self.reply_to = reply_to
+
+
+class CounterResource(Resource):
+    transactional = True
+    key = None
+
+    def coalesce_key(self, handler_name):
+        return self.key
+
+    @actor()
+    async def get(self):
+        assert self.connection is not None
+        self.pool.db.events.append('query')
+        await asyncio.sleep(0.01)
+        return {'count': 1}
+
+
+class PingResource(Resource):
+    @actor()
+    async def ping(self):
+        assert self.connection is None
+        return {'pong': True}
+
+
+async def make_pool():
+    pool = Pool('service', exchange_name='ninjin', connection_factory=LoopbackBroker().connect)
+    await pool.connect()
+    await pool.register(CounterResource)
+    await pool.register(PingResource)
+    pool.db = Engine()
+    pool.database = Database(pool.db)
+
+    async def publish(payload, **kwargs):
+        pool.db.events.append('reply')
+    pool.publish = publish
+    return pool
+
+
+def resource(pool, message=None):
+    return pool.queues.resources['counter']({'handler': 'get', 'payload': {}}, message or Message())
+
+
+@pytest.mark.asyncio
+async def test_reply_is_sent_after_commit():
+    pool = await make_pool()
+    instance = resource(pool)
+    await pool.queues.dispatch(instance)
+    assert pool.db.events == ['acquire', 'begin', 'query', 'commit', 'release', 'reply']
+    assert instance.connection is None
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_no_reply_without_reply_to():
+    pool = await make_pool()
+    await pool.queues.dispatch(resource(pool, Message(reply_to=None)))
+    assert pool.db.events == ['acquire', 'begin', 'query', 'commit', 'release']
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_coalesced_requests_share_one_connection():
+    pool = await make_pool()
+    CounterResource.key = 'counter'
+    try:
+        await asyncio.gather(*[pool.queues.dispatch(resource(pool)) for _ in range(5)])
+    finally:
+        CounterResource.key = None
+    assert pool.db.acquired == 1
+    assert pool.db.events == ['acquire', 'begin', 'query', 'commit', 'release'] + ['reply'] * 5
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_resources_which_are_not_transactional_take_no_connection():
+    pool = await make_pool()
+    await pool.queues.dispatch(pool.queues.resources['ping']({'handler': 'ping', 'payload': {}}, Message()))
+    assert pool.db.events == ['reply']
+    assert pool.stats()['db']['pool_wait']['count'] == 0
+    await pool.close()